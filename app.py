@@ -1,7 +1,21 @@
 import os
+import signal
+import click
 from dotenv import load_dotenv
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import (
+    Flask,
+    after_this_request,
+    current_app,
+    render_template,
+    request,
+    redirect,
+    url_for,
+    flash,
+    jsonify,
+    stream_with_context,
+)
+from flask.cli import AppGroup
 from flask_login import (
     LoginManager,
     login_user,
@@ -10,7 +24,12 @@ from flask_login import (
     current_user,
 )
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from markupsafe import Markup
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import configure_mappers, joinedload
 from models import (
     db,
     User,
@@ -22,39 +41,76 @@ from models import (
     DoctorAvailability,
     Treatment,
 )
+import database
+import export
+import fragments
+import identity
+import instrumentation
+import jobs
+import migrations
+import notifications
+import query_plans
+import rollup
+import roster
+import schedule
+import search
+import synthetic
+import user_import
+import versioning
+from availability import (
+    cached_upcoming_slots,
+    invalidate_doctor_slots,
+    slot_cache,
+    upcoming_slots,
+)
+from history import cached_history, history_cache, invalidate_patient_history
+from http_cache import (
+    conditional_json,
+    payload_cache,
+    validators,
+    with_validators,
+)
+from pagination import InvalidCursor, clamp_page_size, decode_cursor, keyset_page
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = Flask(__name__)
-
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///hospital.db"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev-secret")
-app.config["DEBUG"] = os.environ.get("FLASK_DEBUG", "False") == "True"
-
-db.init_app(app)
+SLOT_TAKEN_MESSAGE = "Error: This slot was just booked by someone else."
 
 # Authentication setup
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = "login"
 
+# Views and CLI commands are declared at module level and attached to each
+# app by create_app.
+VIEWS = []
+cli = AppGroup(__name__)
+
+
+def route(rule, **options):
+    """Like @app.route, for every app that create_app builds."""
+
+    def register(view):
+        VIEWS.append((rule, options, view))
+        return view
+
+    return register
+
 
 @login_manager.user_loader
 def LoadUser(user_id):
-    return db.session.get(User, int(user_id))
+    return identity.load_user(int(user_id))
 
 
 # LOGIN ROUTES
 
 
-@app.route("/", endpoint="home")
+@route("/", endpoint="home")
 def Home():
     return render_template("index.html")
 
 
-@app.route("/login", methods=["GET", "POST"], endpoint="login")
+@route("/login", methods=["GET", "POST"], endpoint="login")
 def Login():
     if request.method == "POST":
         username = request.form.get("username")
@@ -78,7 +134,7 @@ def Login():
     return render_template("login.html")
 
 
-@app.route("/register", methods=["GET", "POST"], endpoint="register")
+@route("/register", methods=["GET", "POST"], endpoint="register")
 def Register():
     if request.method == "POST":
         username = request.form.get("username")
@@ -111,7 +167,7 @@ def Register():
     return render_template("register.html")
 
 
-@app.route("/logout", endpoint="logout")
+@route("/logout", endpoint="logout")
 @login_required
 def Logout():
     logout_user()
@@ -122,51 +178,106 @@ def Logout():
 # ADMIN ROUTES
 
 
-@app.route("/admin_dashboard", endpoint="admin_dashboard")
+def admin_appointments_page(after=None, limit=None):
+    query = Appointment.query.options(
+        joinedload(Appointment.patient), joinedload(Appointment.doctor)
+    )
+    return keyset_page(
+        query,
+        [Appointment.date_scheduled, Appointment.id],
+        after=after,
+        limit=limit or current_app.config["ADMIN_PAGE_SIZE"],
+        descending=True,
+    )
+
+
+def admin_patients_page(after=None, limit=None):
+    query = Patient.query.options(joinedload(Patient.user))
+    return keyset_page(
+        query,
+        [Patient.id],
+        after=after,
+        limit=limit or current_app.config["ADMIN_PAGE_SIZE"],
+    )
+
+
+def admin_doctors_page(after=None, limit=None):
+    """Rows are (doctor, slot_count) so the table never loads availabilities."""
+    slot_count = (
+        db.session.query(func.count(DoctorAvailability.id))
+        .filter(DoctorAvailability.doctor_id == Doctor.id)
+        .scalar_subquery()
+    )
+    query = db.session.query(Doctor, slot_count).options(
+        joinedload(Doctor.user), joinedload(Doctor.department)
+    )
+    return keyset_page(
+        query,
+        [Doctor.id],
+        after=after,
+        limit=limit or current_app.config["ADMIN_PAGE_SIZE"],
+    )
+
+
+@route("/admin_dashboard", endpoint="admin_dashboard")
 @login_required
 def AdminDashboard():
     if current_user.role != "admin":
         flash("Access denied.", "danger")
         return redirect(url_for("login"))
 
-    doctors = Doctor.query.all()
-    patients = Patient.query.all()
     departments = Department.query.all()
 
-    all_appointments = Appointment.query.order_by(
-        Appointment.date_scheduled.desc()
-    ).all()
+    try:
+        appointments, appointments_next = admin_appointments_page(
+            request.args.get("appointments_after")
+        )
+        patients, patients_next = admin_patients_page(
+            request.args.get("patients_after")
+        )
+        doctors, doctors_next = admin_doctors_page(request.args.get("doctors_after"))
+    except InvalidCursor:
+        flash("That page link has expired, showing the first page.", "warning")
+        return redirect(url_for("admin_dashboard"))
 
     counts = {
-        "doctors": len(doctors),
-        "patients": len(patients),
-        "appointments": len(all_appointments),
+        "doctors": db.session.query(func.count(Doctor.id)).scalar(),
+        "patients": db.session.query(func.count(Patient.id)).scalar(),
+        "appointments": db.session.query(func.count(Appointment.id)).scalar(),
     }
 
-    dept_stats = {d.name: 0 for d in departments}
-    all_appointments = Appointment.query.all()
-    for appt in all_appointments:
-        if appt.doctor and appt.doctor.department:
-            name = appt.doctor.department.name
-            if name in dept_stats:
-                dept_stats[name] += 1
+    # Summed from the daily rollup, so the chart never scans appointments.
+    dept_stats = rollup.department_totals(db.session)
 
-    labels = list(dept_stats.keys())
-    values = list(dept_stats.values())
+    labels = [name for name, _ in dept_stats]
+    values = [total for _, total in dept_stats]
+
+    query = request.args.get("q", "").strip()
+    search_results = None
+    if query:
+        search_results = {
+            "patients": search.search_patients(query),
+            "doctors": search.search_doctors(query),
+        }
 
     return render_template(
         "admin_dashboard.html",
         doctors=doctors,
+        doctors_next=doctors_next,
         patients=patients,
+        patients_next=patients_next,
         departments=departments,
-        all_appointments=all_appointments,
+        all_appointments=appointments,
+        appointments_next=appointments_next,
         chart_labels=labels,
         chart_values=values,
         counts=counts,
+        query=query,
+        search_results=search_results,
     )
 
 
-@app.route("/add_department", methods=["POST"], endpoint="add_department")
+@route("/add_department", methods=["POST"], endpoint="add_department")
 @login_required
 def AddDepartment():
     if current_user.role != "admin":
@@ -176,12 +287,13 @@ def AddDepartment():
     if name:
         new_dept = Department(name=name)
         db.session.add(new_dept)
+        versioning.bump(versioning.DEPARTMENTS)
         db.session.commit()
         flash("Department added successfully!", "success")
     return redirect(url_for("admin_dashboard"))
 
 
-@app.route("/add_doctor", methods=["POST"], endpoint="add_doctor")
+@route("/add_doctor", methods=["POST"], endpoint="add_doctor")
 @login_required
 def AddDoctor():
     if current_user.role != "admin":
@@ -201,6 +313,7 @@ def AddDoctor():
         user_id=new_user.id, full_name=full_name, department_id=department_id
     )
     db.session.add(new_doctor)
+    versioning.bump(versioning.DOCTORS)
     db.session.commit()
 
     flash("New Doctor registered successfully!", "success")
@@ -210,7 +323,7 @@ def AddDoctor():
 # DOCTOR ROUTES
 
 
-@app.route("/doctor_dashboard", endpoint="doctor_dashboard")
+@route("/doctor_dashboard", endpoint="doctor_dashboard")
 @login_required
 def DoctorDashboard():
     if current_user.role != "doctor":
@@ -221,13 +334,15 @@ def DoctorDashboard():
 
     appointments = (
         Appointment.query.filter_by(doctor_id=doctor.id)
+        .options(joinedload(Appointment.patient))
         .order_by(Appointment.date_scheduled)
         .all()
     )
     availabilities = DoctorAvailability.query.filter_by(doctor_id=doctor.id).all()
 
-    patient_ids = set(a.patient_id for a in appointments)
-    my_patients = Patient.query.filter(Patient.id.in_(patient_ids)).all()
+    # Patients are already loaded with the appointments; no second query.
+    patients_by_id = {a.patient.id: a.patient for a in appointments}
+    my_patients = [patients_by_id[pid] for pid in sorted(patients_by_id)]
 
     return render_template(
         "doctor_dashboard.html",
@@ -237,7 +352,7 @@ def DoctorDashboard():
     )
 
 
-@app.route(
+@route(
     "/add_treatment/<int:appointment_id>", methods=["POST"], endpoint="add_treatment"
 )
 @login_required
@@ -270,12 +385,13 @@ def AddTreatment(appointment_id):
 
     db.session.add(new_treatment)
     db.session.commit()
+    invalidate_patient_history(appointment.patient_id)
 
     flash("Treatment details saved successfully!", "success")
     return redirect(url_for("doctor_dashboard"))
 
 
-@app.route("/doctor_cancel_appointment/<int:id>", endpoint="doctor_cancel_appointment")
+@route("/doctor_cancel_appointment/<int:id>", endpoint="doctor_cancel_appointment")
 @login_required
 def DoctorCancelAppointment(id):
     appt = Appointment.query.get_or_404(id)
@@ -285,13 +401,15 @@ def DoctorCancelAppointment(id):
         return redirect(url_for("doctor_dashboard"))
 
     appt.status = "Cancelled"
+    notifications.cancelled(appt, by="doctor")
     db.session.commit()
+    invalidate_doctor_slots(appt.doctor_id)
 
     flash("Appointment marked as Cancelled.", "warning")
     return redirect(url_for("doctor_dashboard"))
 
 
-@app.route("/add_availability", methods=["POST"], endpoint="add_availability")
+@route("/add_availability", methods=["POST"], endpoint="add_availability")
 @login_required
 def AddAvailability():
     if current_user.role != "doctor":
@@ -313,25 +431,64 @@ def AddAvailability():
 
     db.session.add(new_slot)
     db.session.commit()
+    invalidate_doctor_slots(new_slot.doctor_id)
 
     flash("Availability slot added!", "success")
     return redirect(url_for("doctor_dashboard"))
 
 
+@route(
+    "/api/doctors/<int:doctor_id>/schedule",
+    methods=["GET", "PUT"],
+    endpoint="api_doctor_schedule",
+)
+def ApiDoctorSchedule(doctor_id):
+    """
+    GET returns the doctor's weekly template and upcoming exceptions; PUT
+    replaces them in one transaction (see schedule.py for the body format).
+    Doctors may manage their own schedule, admins anyone's.
+    """
+    if not current_user.is_authenticated:
+        return jsonify({"error": "Login required"}), 401
+    # A doctor account without a profile row owns no schedule.
+    profile = current_user.doctor_profile if current_user.role == "doctor" else None
+    is_owner = profile is not None and profile.id == doctor_id
+    if not (is_owner or current_user.role == "admin"):
+        return jsonify({"error": "Access denied"}), 403
+    Doctor.query.get_or_404(doctor_id)
+
+    if request.method == "GET":
+        return jsonify(schedule.schedule_grid(doctor_id))
+
+    try:
+        weekly, exceptions = schedule.parse_template(request.get_json(silent=True))
+    except schedule.ScheduleError as exc:
+        return jsonify({"error": "Invalid schedule", "details": exc.errors}), 400
+
+    changes = schedule.apply_template(doctor_id, weekly, exceptions)
+    invalidate_doctor_slots(doctor_id)
+    return jsonify(dict(schedule.schedule_grid(doctor_id), changes=changes))
+
+
 # PATIENT ROUTES
 
 
-@app.route("/patient_dashboard", endpoint="patient_dashboard")
+@route("/patient_dashboard", endpoint="patient_dashboard")
 @login_required
 def PatientDashboard():
     if current_user.role != "patient":
         return redirect(url_for("home"))
 
-    departments = Department.query.all()
+    # Only run when the cached department list fragment is stale.
+    departments = Department.query.order_by(Department.id)
 
     patient_id = current_user.patient_profile.id
     my_appointments = (
         Appointment.query.filter_by(patient_id=patient_id)
+        .options(
+            joinedload(Appointment.doctor).joinedload(Doctor.department),
+            joinedload(Appointment.treatment),
+        )
         .order_by(Appointment.date_scheduled.desc())
         .all()
     )
@@ -341,74 +498,28 @@ def PatientDashboard():
     )
 
 
-@app.route("/department/<int:dept_id>", endpoint="view_department")
+@route("/department/<int:dept_id>", endpoint="view_department")
 @login_required
 def ViewDepartment(dept_id):
+    # dept.doctors is loaded lazily, only when the cached fragment is stale;
+    # on a miss that is one query for the whole list.
     medical_unit = Department.query.get_or_404(dept_id)
     return render_template("department_view.html", dept=medical_unit)
 
 
-@app.route(
-    "/book/<int:doctor_id>", methods=["GET", "POST"], endpoint="book_appointment"
-)
+@route("/book/<int:doctor_id>", methods=["GET", "POST"], endpoint="book_appointment")
 @login_required
 def BookAppointment(doctor_id):
     doctor = Doctor.query.get_or_404(doctor_id)
 
-    weekly_schedule = DoctorAvailability.query.filter_by(doctor_id=doctor_id).all()
-
-    existing_appointments = Appointment.query.filter_by(doctor_id=doctor_id).all()
-
-    booked_slots = set()
-    for appt in existing_appointments:
-        booked_key = f"{appt.date_scheduled} {appt.time_scheduled}"
-        booked_slots.add(booked_key)
-
-    available_slots = []
-    today = datetime.now().date()
-
-    schedule_map = {}
-    for slot in weekly_schedule:
-        if slot.day_of_week not in schedule_map:
-            schedule_map[slot.day_of_week] = []
-        schedule_map[slot.day_of_week].append(slot)
-
-    for i in range(7):
-        current_day = today + timedelta(days=i)
-        day_name = current_day.strftime("%A")
-        date_str = current_day.strftime("%Y-%m-%d")
-
-        if day_name in schedule_map:
-            for slot in schedule_map[day_name]:
-
-                slot_key = f"{date_str} {slot.start_time}"
-
-                is_taken = slot_key in booked_slots
-
-                available_slots.append(
-                    {
-                        "date_obj": current_day,
-                        "date_str": date_str,
-                        "day_name": day_name,
-                        "start": slot.start_time,
-                        "end": slot.end_time,
-                        "is_taken": is_taken,
-                    }
-                )
+    available_slots = cached_upcoming_slots(
+        doctor_id, horizon_days=current_app.config["BOOKING_HORIZON_DAYS"]
+    )
 
     if request.method == "POST":
         date_str = request.form.get("date")
         time_str = request.form.get("time")
 
-        existing = Appointment.query.filter_by(
-            doctor_id=doctor_id,
-            date_scheduled=datetime.strptime(date_str, "%Y-%m-%d").date(),
-            time_scheduled=datetime.strptime(time_str, "%H:%M:%S").time(),
-        ).first()
-        if existing:
-            flash("Error: This slot was just booked by someone else.", "danger")
-            return redirect(url_for("book_appointment", doctor_id=doctor_id))
-
         scheduled_visit = Appointment(
             patient_id=current_user.patient_profile.id,
             doctor_id=doctor_id,
@@ -417,21 +528,38 @@ def BookAppointment(doctor_id):
             status="Scheduled",
         )
         db.session.add(scheduled_visit)
-        db.session.commit()
+
+        # The partial unique index on slot-holding appointments is the source of
+        # truth: a concurrent booking of the same slot fails here, whichever
+        # worker it came from.
+        try:
+            db.session.flush()
+            notifications.booked(scheduled_visit)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            # Our cached grid showed the slot as free, so it is stale.
+            invalidate_doctor_slots(doctor_id)
+            flash(SLOT_TAKEN_MESSAGE, "danger")
+            return redirect(url_for("book_appointment", doctor_id=doctor_id))
+        invalidate_doctor_slots(doctor_id)
+
         flash("Appointment Booked Successfully!", "success")
         return redirect(url_for("patient_dashboard"))
 
     return render_template("booking.html", doctor=doctor, slots=available_slots)
 
 
-@app.route("/api/departments", methods=["GET"], endpoint="api_get_departments")
+@route("/api/departments", methods=["GET"], endpoint="api_get_departments")
 def ApiGetDepartments():
-    depts = Department.query.all()
-    data = [{"id": d.id, "name": d.name} for d in depts]
-    return jsonify(data)
+    def build():
+        depts = db.session.query(Department.id, Department.name).order_by(Department.id)
+        return [{"id": d.id, "name": d.name} for d in depts]
 
+    return conditional_json("departments", [versioning.DEPARTMENTS], build)
 
-@app.route("/api/department", methods=["POST"], endpoint="api_create_dept")
+
+@route("/api/department", methods=["POST"], endpoint="api_create_dept")
 def ApiCreateDepartment():
     data = request.get_json()
     if not data or "name" not in data:
@@ -439,49 +567,288 @@ def ApiCreateDepartment():
 
     new_dept = Department(name=data["name"])
     db.session.add(new_dept)
+    versioning.bump(versioning.DEPARTMENTS)
     db.session.commit()
     return jsonify({"message": "Department created", "id": new_dept.id}), 201
 
 
-@app.route("/api/department/<int:id>", methods=["PUT"], endpoint="api_update_dept")
+@route("/api/department/<int:id>", methods=["PUT"], endpoint="api_update_dept")
 def ApiUpdateDepartment(id):
     medical_unit = Department.query.get_or_404(id)
     data = request.get_json()
     if "name" in data:
         medical_unit.name = data["name"]
 
+    versioning.bump(versioning.DEPARTMENTS)
     db.session.commit()
     return jsonify({"message": "Department updated successfully"})
 
 
-@app.route("/api/department/<int:id>", methods=["DELETE"], endpoint="api_delete_dept")
+@route("/api/department/<int:id>", methods=["DELETE"], endpoint="api_delete_dept")
 def ApiDeleteDepartment(id):
     medical_unit = Department.query.get_or_404(id)
     db.session.delete(medical_unit)
+    # Doctors in the department lose their department name.
+    versioning.bump(versioning.DEPARTMENTS, versioning.DOCTORS)
     db.session.commit()
     return jsonify({"message": "Department deleted successfully"})
 
 
-@app.route("/api/doctors", methods=["GET"], endpoint="api_get_doctors")
+@route("/api/doctors", methods=["GET"], endpoint="api_get_doctors")
 def ApiGetDoctors():
-    docs = Doctor.query.all()
-    data = []
-    for d in docs:
-        data.append(
-            {
-                "id": d.id,
-                "name": d.full_name,
-                "department": d.department.name if d.department else "None",
-                "qualification": d.qualification,
-            }
+    """
+    Doctor roster. Query parameters, all optional:
+    department_id, qualification (substring match), fields (comma separated),
+    limit/after for cursor pages ({"items", "next"}), and format=ndjson (or
+    Accept: application/x-ndjson) to stream one JSON object per line.
+    Without limit/after/format the full list is returned as before.
+    """
+
+    @after_this_request
+    def vary_on_accept(response):
+        # The Accept header can choose NDJSON over the JSON array.
+        response.vary.add("Accept")
+        return response
+
+    args = request.args
+    try:
+        fields = roster.parse_fields(args.get("fields"))
+        department_id = roster.parse_department_id(args.get("department_id"))
+    except roster.InvalidRosterQuery as exc:
+        return jsonify({"error": str(exc)}), 400
+    qualification = args.get("qualification", "").strip()
+    query = roster.roster_query(department_id, qualification)
+
+    versions = [versioning.DOCTORS, versioning.DEPARTMENTS]
+    cache_key = "doctors?" + urlencode(sorted(args.items(multi=True)))
+
+    wants_ndjson = args.get("format") == "ndjson" or (
+        request.accept_mimetypes.best == "application/x-ndjson"
+    )
+    if wants_ndjson:
+        etag, last_modified, not_modified = validators(cache_key + "|ndjson", versions)
+        if not_modified:
+            return with_validators(
+                current_app.response_class(status=304), etag, last_modified
+            )
+
+        def generate():
+            for row in roster.stream(query):
+                yield current_app.json.dumps(roster.serialize(row, fields)) + "\n"
+
+        response = current_app.response_class(
+            stream_with_context(generate()), mimetype="application/x-ndjson"
+        )
+        return with_validators(response, etag, last_modified)
+
+    if "limit" in args or "after" in args:
+        limit = clamp_page_size(args.get("limit"))
+        after = args.get("after")
+        try:
+            if after:
+                decode_cursor(after, [Doctor.id])
+        except InvalidCursor as exc:
+            return jsonify({"error": str(exc)}), 400
+
+        def build():
+            rows, next_cursor = keyset_page(
+                query, [Doctor.id], after=after, limit=limit
+            )
+            items = [roster.serialize(row, fields) for row in rows]
+            return {"items": items, "next": next_cursor}
+
+        return conditional_json(cache_key, versions, build)
+
+    def build():
+        return [roster.serialize(row, fields) for row in query.order_by(Doctor.id)]
+
+    return conditional_json(cache_key, versions, build)
+
+
+# ADMIN JSON PAGES
+
+
+def admin_page_response(fetch, serialize):
+    if not current_user.is_authenticated or current_user.role != "admin":
+        return jsonify({"error": "Admin access required"}), 403
+
+    limit = clamp_page_size(
+        request.args.get("limit"), current_app.config["ADMIN_PAGE_SIZE"]
+    )
+    try:
+        rows, next_cursor = fetch(request.args.get("after"), limit)
+    except InvalidCursor as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    return jsonify({"items": [serialize(row) for row in rows], "next": next_cursor})
+
+
+@route("/api/admin/appointments", methods=["GET"], endpoint="api_admin_appointments")
+def ApiAdminAppointments():
+    def serialize(appt):
+        return {
+            "id": appt.id,
+            "date": appt.date_scheduled.isoformat(),
+            "time": appt.time_scheduled.strftime("%H:%M:%S"),
+            "status": appt.status,
+            "patient": appt.patient.full_name,
+            "doctor": appt.doctor.full_name,
+        }
+
+    return admin_page_response(admin_appointments_page, serialize)
+
+
+@route("/api/admin/patients", methods=["GET"], endpoint="api_admin_patients")
+def ApiAdminPatients():
+    def serialize(pat):
+        return {
+            "id": pat.id,
+            "name": pat.full_name,
+            "username": pat.user.username,
+            "phone": pat.phone,
+        }
+
+    return admin_page_response(admin_patients_page, serialize)
+
+
+@route("/api/admin/doctors", methods=["GET"], endpoint="api_admin_doctors")
+def ApiAdminDoctors():
+    def serialize(row):
+        doc, slot_count = row
+        return {
+            "id": doc.id,
+            "name": doc.full_name,
+            "username": doc.user.username,
+            "department": doc.department.name if doc.department else "None",
+            "slots": slot_count,
+        }
+
+    return admin_page_response(admin_doctors_page, serialize)
+
+
+@route("/api/admin/search", methods=["GET"], endpoint="api_admin_search")
+def ApiAdminSearch():
+    if not current_user.is_authenticated or current_user.role != "admin":
+        return jsonify({"error": "Admin access required"}), 403
+
+    query = request.args.get("q", "")
+    limit = search.clamp_limit(request.args.get("limit"))
+    patients = search.search_patients(query, limit)
+    doctors = search.search_doctors(query, limit)
+    return jsonify(
+        {
+            "patients": [
+                {
+                    "id": row.id,
+                    "name": row.full_name,
+                    "username": row.username,
+                    "phone": row.phone,
+                }
+                for row in patients
+            ],
+            "doctors": [
+                {
+                    "id": row.id,
+                    "name": row.full_name,
+                    "username": row.username,
+                    "department": row.department or "None",
+                    "qualification": row.qualification,
+                }
+                for row in doctors
+            ],
+        }
+    )
+
+
+@route("/api/admin/cache_stats", methods=["GET"], endpoint="api_admin_cache_stats")
+def ApiAdminCacheStats():
+    if not current_user.is_authenticated or current_user.role != "admin":
+        return jsonify({"error": "Admin access required"}), 403
+    return jsonify(
+        {
+            "slots": slot_cache.stats(),
+            "api_payloads": payload_cache.stats(),
+            "history": history_cache.stats(),
+            "fragments": fragments.fragment_cache.stats(),
+            "users": identity.identity_cache.stats(),
+            "jobs": jobs.queue_stats(),
+        }
+    )
+
+
+@route("/api/admin/export", methods=["GET"], endpoint="api_admin_export")
+def ApiAdminExport():
+    if not current_user.is_authenticated or current_user.role != "admin":
+        return jsonify({"error": "Admin access required"}), 403
+
+    fmt = request.args.get("format", "csv")
+    use_gzip = request.args.get("gzip") in ("1", "true", "yes")
+    try:
+        start = export.parse_date(request.args.get("start"), "start")
+        end = export.parse_date(request.args.get("end"), "end")
+        export.validate(fmt, start, end)
+    except export.InvalidExport as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    chunks = export.stream(fmt, start, end)
+    if use_gzip:
+        chunks = export.gzipped(chunks)
+        mimetype = "application/gzip"
+    else:
+        mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+
+    response = current_app.response_class(
+        stream_with_context(chunks), mimetype=mimetype
+    )
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename={export.filename(fmt, start, end, use_gzip)}"
+    )
+    return response
+
+
+@route("/api/stats", methods=["GET"], endpoint="api_stats")
+def ApiStats():
+    """
+    Daily appointment counts from the rollup. Query parameters: start and end
+    (YYYY-MM-DD, default the last 30 days), group_by (status, department or
+    doctor) and optional department_id / doctor_id filters.
+    """
+    if not current_user.is_authenticated or current_user.role != "admin":
+        return jsonify({"error": "Admin access required"}), 403
+
+    args = request.args
+    try:
+        end = rollup.parse_date(args.get("end"), "end") or date.today()
+        start = rollup.parse_date(args.get("start"), "start") or end - timedelta(
+            days=29
         )
-    return jsonify(data)
+        department_id = args.get("department_id", type=int)
+        doctor_id = args.get("doctor_id", type=int)
+        result = rollup.trend(
+            db.session,
+            start,
+            end,
+            group_by=args.get("group_by", "status"),
+            department_id=department_id,
+            doctor_id=doctor_id,
+        )
+    except rollup.InvalidStatsQuery as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    return jsonify(
+        {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "group_by": args.get("group_by", "status"),
+            **result,
+        }
+    )
 
 
 # PROFILE MANAGEMENT
 
 
-@app.route("/profile", methods=["GET", "POST"], endpoint="profile")
+@route("/profile", methods=["GET", "POST"], endpoint="profile")
 @login_required
 def Profile():
     user_profile = None
@@ -502,15 +869,17 @@ def Profile():
                 user_profile.age = request.form.get("age")
             elif current_user.role == "doctor":
                 user_profile.qualification = request.form.get("qualification")
+                versioning.bump(versioning.DOCTORS)
 
             db.session.commit()
+            identity.invalidate_user(current_user.id)
             flash("Profile updated successfully!", "success")
             return redirect(url_for("profile"))
 
     return render_template("profile.html", user=current_user, profile=user_profile)
 
 
-@app.route("/cancel_appointment/<int:id>", endpoint="cancel_appointment")
+@route("/cancel_appointment/<int:id>", endpoint="cancel_appointment")
 @login_required
 def CancelAppointment(id):
     appt = Appointment.query.get_or_404(id)
@@ -520,7 +889,9 @@ def CancelAppointment(id):
 
     if appt.status == "Scheduled":
         appt.status = "Cancelled"
+        notifications.cancelled(appt, by="patient")
         db.session.commit()
+        invalidate_doctor_slots(appt.doctor_id)
         flash("Appointment cancelled.", "info")
     else:
         flash("Cannot cancel a completed appointment.", "warning")
@@ -528,7 +899,7 @@ def CancelAppointment(id):
     return redirect(url_for("patient_dashboard"))
 
 
-@app.route("/reschedule/<int:appt_id>", methods=["GET", "POST"], endpoint="reschedule")
+@route("/reschedule/<int:appt_id>", methods=["GET", "POST"], endpoint="reschedule")
 @login_required
 def RescheduleAppointment(appt_id):
     appt = Appointment.query.get_or_404(appt_id)
@@ -539,44 +910,11 @@ def RescheduleAppointment(appt_id):
 
     doctor = appt.doctor
 
-    weekly_schedule = DoctorAvailability.query.filter_by(doctor_id=doctor.id).all()
-    existing_appointments = Appointment.query.filter_by(doctor_id=doctor.id).all()
-
-    booked_slots = set()
-    for a in existing_appointments:
-        if a.id != appt.id:
-            booked_key = f"{a.date_scheduled} {a.time_scheduled}"
-            booked_slots.add(booked_key)
-
-    available_slots = []
-    today = datetime.now().date()
-
-    schedule_map = {}
-    for slot in weekly_schedule:
-        if slot.day_of_week not in schedule_map:
-            schedule_map[slot.day_of_week] = []
-        schedule_map[slot.day_of_week].append(slot)
-
-    for i in range(7):
-        current_day = today + timedelta(days=i)
-        day_name = current_day.strftime("%A")
-        date_str = current_day.strftime("%Y-%m-%d")
-
-        if day_name in schedule_map:
-            for slot in schedule_map[day_name]:
-                slot_key = f"{date_str} {slot.start_time}"
-                is_taken = slot_key in booked_slots
-
-                available_slots.append(
-                    {
-                        "date_obj": current_day,
-                        "date_str": date_str,
-                        "day_name": day_name,
-                        "start": slot.start_time,
-                        "end": slot.end_time,
-                        "is_taken": is_taken,
-                    }
-                )
+    available_slots = upcoming_slots(
+        doctor.id,
+        horizon_days=current_app.config["BOOKING_HORIZON_DAYS"],
+        exclude_appointment_id=appt.id,
+    )
 
     if request.method == "POST":
         date_str = request.form.get("date")
@@ -585,8 +923,17 @@ def RescheduleAppointment(appt_id):
         appt.date_scheduled = datetime.strptime(date_str, "%Y-%m-%d").date()
         appt.time_scheduled = datetime.strptime(time_str, "%H:%M:%S").time()
         appt.status = "Scheduled"
+        notifications.rescheduled(appt)
+
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            invalidate_doctor_slots(doctor.id)
+            flash(SLOT_TAKEN_MESSAGE, "danger")
+            return redirect(url_for("reschedule", appt_id=appt_id))
+        invalidate_doctor_slots(doctor.id)
 
-        db.session.commit()
         flash("Appointment Rescheduled Successfully!", "success")
         return redirect(url_for("patient_dashboard"))
 
@@ -598,33 +945,30 @@ def RescheduleAppointment(appt_id):
 def create_admin():
     """
     Creates a default Admin account if one doesn't exist.
-    Credential: admin / 12345
+    Credential: admin / 12345. Needs an app context.
     """
-    with app.app_context():
-        admin_user = User.query.filter_by(role="admin").first()
-        if not admin_user:
-            print("--- NO ADMIN FOUND. CREATING DEFAULT ADMIN... ---")
+    admin_user = User.query.filter_by(role="admin").first()
+    if not admin_user:
+        print("--- NO ADMIN FOUND. CREATING DEFAULT ADMIN... ---")
 
-            hashed_pw = generate_password_hash("12345", method="pbkdf2:sha256")
-            new_admin_user = User(username="admin", password=hashed_pw, role="admin")
-            db.session.add(new_admin_user)
-            db.session.commit()
+        hashed_pw = generate_password_hash("12345", method="pbkdf2:sha256")
+        new_admin_user = User(username="admin", password=hashed_pw, role="admin")
+        db.session.add(new_admin_user)
+        db.session.commit()
 
-            new_admin_profile = Admin(
-                user_id=new_admin_user.id, full_name="Super Admin"
-            )
-            db.session.add(new_admin_profile)
-            db.session.commit()
+        new_admin_profile = Admin(user_id=new_admin_user.id, full_name="Super Admin")
+        db.session.add(new_admin_profile)
+        db.session.commit()
 
-            print("--- ADMIN CREATED: Login with 'admin' / '12345' ---")
-        else:
-            print("--- Admin account already exists. ---")
+        print("--- ADMIN CREATED: Login with 'admin' / '12345' ---")
+    else:
+        print("--- Admin account already exists. ---")
 
 
 # ADMIN MANAGEMENT ROUTES
 
 
-@app.route("/edit_doctor/<int:id>", methods=["GET", "POST"], endpoint="edit_doctor")
+@route("/edit_doctor/<int:id>", methods=["GET", "POST"], endpoint="edit_doctor")
 @login_required
 def EditDoctor(id):
     if current_user.role != "admin":
@@ -639,14 +983,16 @@ def EditDoctor(id):
         if dept_id:
             doctor.department_id = dept_id
 
+        versioning.bump(versioning.DOCTORS)
         db.session.commit()
+        identity.invalidate_user(doctor.user_id)
         flash("Doctor profile updated successfully!", "success")
         return redirect(url_for("admin_dashboard"))
 
     return render_template("edit_doctor.html", doctor=doctor, departments=departments)
 
 
-@app.route("/delete_doctor/<int:id>", endpoint="delete_doctor")
+@route("/delete_doctor/<int:id>", endpoint="delete_doctor")
 @login_required
 def DeleteDoctor(id):
     if current_user.role != "admin":
@@ -654,25 +1000,31 @@ def DeleteDoctor(id):
 
     doctor = Doctor.query.get_or_404(id)
 
-    current_account = User.query.get(doctor.user_id)
+    user_id = doctor.user_id
+    current_account = User.query.get(user_id)
 
     db.session.delete(doctor)
     db.session.delete(current_account)
+    versioning.bump(versioning.DOCTORS)
     db.session.commit()
+    identity.invalidate_user(user_id)
 
     flash("Doctor deleted successfully.", "info")
     return redirect(url_for("admin_dashboard"))
 
 
-@app.route("/admin_delete_appt/<int:id>", endpoint="admin_delete_appt")
+@route("/admin_delete_appt/<int:id>", endpoint="admin_delete_appt")
 @login_required
 def AdminDeleteAppt(id):
     if current_user.role != "admin":
         return redirect(url_for("home"))
 
     appt = Appointment.query.get_or_404(id)
+    doctor_id, patient_id = appt.doctor_id, appt.patient_id
     db.session.delete(appt)
     db.session.commit()
+    invalidate_doctor_slots(doctor_id)
+    invalidate_patient_history(patient_id)
 
     flash("Appointment record deleted.", "info")
     return redirect(url_for("admin_dashboard"))
@@ -681,7 +1033,30 @@ def AdminDeleteAppt(id):
 # DOCTOR: VIEW PATIENT HISTORY
 
 
-@app.route("/doctor_view_history/<int:patient_id>", endpoint="doctor_view_history")
+def render_history(patient):
+    """Page of the patient's history as cached HTML; None for a bad cursor."""
+    after = request.args.get("after")
+    limit = current_app.config["HISTORY_PAGE_SIZE"]
+
+    def build(history, next_cursor):
+        return Markup(
+            render_template(
+                "_history_records.html",
+                history=history,
+                next_cursor=next_cursor,
+                after=after,
+                endpoint=request.endpoint,
+                patient_id=patient.id,
+            )
+        )
+
+    try:
+        return cached_history(patient.id, request.endpoint, after, limit, build)
+    except InvalidCursor:
+        return None
+
+
+@route("/doctor_view_history/<int:patient_id>", endpoint="doctor_view_history")
 @login_required
 def DoctorViewHistory(patient_id):
     if current_user.role != "doctor":
@@ -689,36 +1064,82 @@ def DoctorViewHistory(patient_id):
 
     patient = Patient.query.get_or_404(patient_id)
 
-    history = (
-        Appointment.query.filter_by(patient_id=patient_id, status="Completed")
-        .order_by(Appointment.date_scheduled.desc())
-        .all()
-    )
+    history_html = render_history(patient)
+    if history_html is None:
+        flash("That page link has expired, showing the latest visits.", "warning")
+        return redirect(url_for("doctor_view_history", patient_id=patient_id))
 
     return render_template(
-        "patient_history_doctor.html", patient=patient, history=history
+        "patient_history_doctor.html", patient=patient, history_html=history_html
     )
 
 
-@app.route("/admin_view_history/<int:patient_id>", endpoint="admin_view_history")
+@route("/admin_view_history/<int:patient_id>", endpoint="admin_view_history")
 @login_required
 def AdminViewHistory(patient_id):
     if current_user.role != "admin":
         return redirect(url_for("login"))
 
     patient = Patient.query.get_or_404(patient_id)
-    history = (
-        Appointment.query.filter_by(patient_id=patient_id, status="Completed")
-        .order_by(Appointment.date_scheduled.desc())
-        .all()
-    )
+    history_html = render_history(patient)
+    if history_html is None:
+        flash("That page link has expired, showing the latest visits.", "warning")
+        return redirect(url_for("admin_view_history", patient_id=patient_id))
 
     return render_template(
-        "patient_history_doctor.html", patient=patient, history=history
+        "patient_history_doctor.html", patient=patient, history_html=history_html
     )
 
 
-@app.route(
+@route(
+    "/api/patients/<int:patient_id>/history",
+    methods=["GET"],
+    endpoint="api_patient_history",
+)
+def ApiPatientHistory(patient_id):
+    if not current_user.is_authenticated:
+        return jsonify({"error": "Login required"}), 401
+    is_patient = current_user.role == "patient"
+    if is_patient and current_user.patient_profile.id != patient_id:
+        return jsonify({"error": "You can only view your own history"}), 403
+    if current_user.role not in ("patient", "doctor", "admin"):
+        return jsonify({"error": "Access denied"}), 403
+    Patient.query.get_or_404(patient_id)
+
+    def build(history, next_cursor):
+        items = []
+        for appt in history:
+            treatment = appt.treatment
+            item = {
+                "appointment_id": appt.id,
+                "date": appt.date_scheduled.isoformat(),
+                "time": appt.time_scheduled.strftime("%H:%M:%S"),
+                "doctor": appt.doctor.full_name,
+                "diagnosis": treatment.diagnosis if treatment else None,
+                "prescription": treatment.prescription if treatment else None,
+                "visit_type": treatment.visit_type if treatment else None,
+                "tests_done": treatment.tests_done if treatment else None,
+            }
+            # Notes are internal to the care team.
+            if not is_patient:
+                item["notes"] = treatment.notes if treatment else None
+            items.append(item)
+        return {"items": items, "next": next_cursor}
+
+    limit = clamp_page_size(
+        request.args.get("limit"), current_app.config["HISTORY_PAGE_SIZE"]
+    )
+    kind = "json-patient" if is_patient else "json"
+    try:
+        payload = cached_history(
+            patient_id, kind, request.args.get("after"), limit, build
+        )
+    except InvalidCursor as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify(payload)
+
+
+@route(
     "/edit_patient_admin/<int:id>",
     methods=["GET", "POST"],
     endpoint="edit_patient_admin",
@@ -737,37 +1158,364 @@ def EditPatientAdmin(id):
         patient.age = request.form.get("age")
 
         db.session.commit()
+        identity.invalidate_user(patient.user_id)
         flash("Patient details updated.", "success")
         return redirect(url_for("admin_dashboard"))
 
     return render_template("edit_patient_admin.html", patient=patient)
 
 
-@app.route("/delete_patient/<int:id>", endpoint="delete_patient")
+@route("/delete_patient/<int:id>", endpoint="delete_patient")
 @login_required
 def DeletePatient(id):
     if current_user.role != "admin":
         return redirect(url_for("home"))
 
     patient = Patient.query.get_or_404(id)
-    current_account = User.query.get(patient.user_id)
+    user_id = patient.user_id
+    current_account = User.query.get(user_id)
 
     db.session.delete(patient)
     db.session.delete(current_account)
     db.session.commit()
+    identity.invalidate_user(user_id)
 
     flash("Patient removed from system.", "warning")
     return redirect(url_for("admin_dashboard"))
 
 
-@app.errorhandler(404)
+# TREATMENT RECORD SEARCH
+
+
+def record_search_scope():
+    """Doctors search their own patients' records, admins search all of them."""
+    if not current_user.is_authenticated:
+        return False, None
+    if current_user.role == "doctor":
+        return True, current_user.doctor_profile.id
+    return current_user.role == "admin", None
+
+
+@route("/records/search", methods=["GET"], endpoint="search_records")
+@login_required
+def SearchRecords():
+    allowed, doctor_id = record_search_scope()
+    if not allowed:
+        flash("Access denied.", "danger")
+        return redirect(url_for("home"))
+
+    query = request.args.get("q", "").strip()
+    field = request.args.get("field") or None
+    try:
+        results, next_cursor = search.search_treatments(
+            query,
+            doctor_id=doctor_id,
+            field=field,
+            after=request.args.get("after"),
+            limit=current_app.config["ADMIN_PAGE_SIZE"],
+        )
+    except (InvalidCursor, search.InvalidSearch):
+        flash("That search link is no longer valid.", "warning")
+        return redirect(url_for("search_records", q=query))
+
+    return render_template(
+        "records_search.html",
+        query=query,
+        field=field,
+        fields=search.TREATMENT_FIELDS,
+        results=results,
+        next_cursor=next_cursor,
+        highlight=search.highlight,
+    )
+
+
+@route("/api/records/search", methods=["GET"], endpoint="api_search_records")
+def ApiSearchRecords():
+    allowed, doctor_id = record_search_scope()
+    if not allowed:
+        return jsonify({"error": "Doctor or admin access required"}), 403
+
+    try:
+        results, next_cursor = search.search_treatments(
+            request.args.get("q", ""),
+            doctor_id=doctor_id,
+            field=request.args.get("field") or None,
+            after=request.args.get("after"),
+            limit=clamp_page_size(
+                request.args.get("limit"), current_app.config["ADMIN_PAGE_SIZE"]
+            ),
+        )
+    except (InvalidCursor, search.InvalidSearch) as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    return jsonify(
+        {
+            "items": [
+                {
+                    "treatment_id": row.id,
+                    "appointment_id": row.appointment_id,
+                    "date": row.date_scheduled.isoformat(),
+                    "patient_id": row.patient_id,
+                    "patient": row.patient,
+                    "doctor": row.doctor,
+                    "snippet": str(search.highlight(row.snippet)),
+                }
+                for row in results
+            ],
+            "next": next_cursor,
+        }
+    )
+
+
+# CLI COMMANDS
+
+
+@cli.command("bootstrap")
+def BootstrapCommand():
+    """Create tables, apply migrations and create the default admin if needed."""
+    try:
+        bootstrap(echo=click.echo)
+    except migrations.MigrationError as exc:
+        raise click.ClickException(str(exc))
+
+
+@cli.command("migrate")
+def MigrateCommand():
+    """Create missing tables and apply pending schema migrations."""
+    db.create_all()
+    try:
+        migrations.upgrade(db.engine, echo=click.echo)
+    except migrations.MigrationError as exc:
+        raise click.ClickException(str(exc))
+
+
+@cli.command("seed")
+@click.option("--doctors", default=50, show_default=True)
+@click.option("--patients", default=5000, show_default=True)
+@click.option("--appointments", default=50000, show_default=True)
+@click.option("--years", default=3, show_default=True, help="History to spread over.")
+@click.option("--seed", "rng_seed", default=1, show_default=True)
+@click.option(
+    "--anchor-date",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    default=synthetic.ANCHOR_DATE.isoformat(),
+    show_default=True,
+    help="The day the data treats as today.",
+)
+@click.option("--password", default="password", show_default=True)
+@click.option("--batch-size", default=synthetic.BATCH_SIZE, show_default=True)
+def SeedCommand(
+    doctors, patients, appointments, years, rng_seed, anchor_date, password, batch_size
+):
+    """Fill the database with deterministic synthetic data for scale testing."""
+    db.create_all()
+    try:
+        migrations.upgrade(db.engine, echo=click.echo)
+        inserted = synthetic.generate(
+            doctors,
+            patients,
+            appointments,
+            years=years,
+            rng_seed=rng_seed,
+            password=password,
+            batch_size=batch_size,
+            anchor_date=anchor_date.date(),
+            echo=click.echo,
+        )
+    except (migrations.MigrationError, synthetic.SeedError) as exc:
+        raise click.ClickException(str(exc))
+    for table, rows in inserted.items():
+        click.echo(f"{table}: {rows} rows")
+
+
+@cli.command("import-users")
+@click.argument("csv_file", type=click.File("r", encoding="utf-8-sig"))
+@click.option("--batch-size", default=1000, show_default=True)
+@click.option("--workers", type=int, help="Hashing processes [default: CPU count]")
+def ImportUsersCommand(csv_file, batch_size, workers):
+    """Bulk-create doctors and patients from a CSV file."""
+    try:
+        report = user_import.import_users(
+            csv_file, batch_size=batch_size, workers=workers, echo=click.echo
+        )
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+
+    for line_no, reason in report.skipped:
+        click.echo(f"Skipped line {line_no}: {reason}", err=True)
+    click.echo(
+        f"Created {report.created} users, skipped {len(report.skipped)} rows "
+        f"in {report.elapsed:.1f}s ({report.rows_per_second:.0f} rows/s)."
+    )
+
+
+@cli.command("export-appointments")
+@click.option("--format", "fmt", type=click.Choice(export.FORMATS), default="csv")
+@click.option("--start", help="First appointment date, YYYY-MM-DD.")
+@click.option("--end", help="Last appointment date, YYYY-MM-DD.")
+@click.option("--gzip", "use_gzip", is_flag=True, help="Gzip the output.")
+@click.option("--batch-size", default=export.BATCH_SIZE, show_default=True)
+@click.option(
+    "--output",
+    "-o",
+    type=click.File("wb"),
+    default="-",
+    help="Destination file [default: stdout].",
+)
+def ExportAppointmentsCommand(fmt, start, end, use_gzip, batch_size, output):
+    """Stream appointments with patient, doctor and treatment details."""
+    try:
+        start = export.parse_date(start, "--start")
+        end = export.parse_date(end, "--end")
+        export.validate(fmt, start, end)
+    except export.InvalidExport as exc:
+        raise click.ClickException(str(exc))
+
+    chunks = export.stream(fmt, start, end, batch_size)
+    if use_gzip:
+        chunks = export.gzipped(chunks)
+    for chunk in chunks:
+        output.write(chunk)
+    output.flush()
+
+
+@cli.command("rebuild-stats")
+def RebuildStatsCommand():
+    """Recompute the daily appointment statistics rollup from scratch."""
+    with db.engine.begin() as conn:
+        rows = rollup.rebuild(conn)
+    click.echo(f"Rebuilt appointment_daily_stat: {rows} rows.")
+
+
+@cli.command("worker")
+@click.option("--batch-size", default=50, show_default=True)
+@click.option("--poll-interval", default=2.0, show_default=True, help="Seconds.")
+@click.option("--once", is_flag=True, help="Exit when no jobs are due.")
+def WorkerCommand(batch_size, poll_interval, once):
+    """Run queued background jobs such as appointment notifications."""
+    sender = notifications.load_sender(current_app.config["NOTIFICATION_SENDER"])
+    stopping = []
+
+    def stop(signum, frame):
+        # Finish the batch in hand, then exit.
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    processed = jobs.work(
+        sender,
+        batch_size=batch_size,
+        poll_interval=poll_interval,
+        once=once,
+        should_stop=lambda: bool(stopping),
+    )
+    click.echo(f"Processed {processed} jobs.")
+
+
+@cli.command("check-query-plans")
+def CheckQueryPlansCommand():
+    """Fail if a hot query falls back to a full table scan."""
+    failures = query_plans.check_plans(db.engine)
+    for name, lines in failures.items():
+        click.echo(f"FULL SCAN in {name}:", err=True)
+        for line in lines:
+            click.echo(f"    {line}", err=True)
+    if failures:
+        raise SystemExit(1)
+    click.echo(f"All {len(query_plans.HOT_QUERIES)} hot queries use indexes.")
+
+
 def page_not_found(e):
     return render_template("404.html"), 404
 
 
+def bootstrap(echo=print):
+    """Create missing tables, apply migrations and make sure an admin exists."""
+    db.create_all()
+    migrations.upgrade(db.engine, echo=echo)
+    create_admin()
+
+
+def warm_up(app):
+    """
+    Do the one-off work of a worker's first request ahead of time: compile
+    every template and configure the ORM mappers. Under `gunicorn --preload`
+    this runs once in the master (see gunicorn.conf.py) and forked workers
+    share the result copy-on-write.
+    """
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    configure_mappers()
+
+
+def create_app(config=None):
+    """Build the app. `config` overrides the settings read from the environment."""
+    app = Flask(__name__)
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = database.database_url()
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev-secret")
+    app.config["DEBUG"] = os.environ.get("FLASK_DEBUG", "False") == "True"
+    app.config["ADMIN_PAGE_SIZE"] = int(os.environ.get("ADMIN_PAGE_SIZE", "25"))
+    app.config["BOOKING_HORIZON_DAYS"] = int(
+        os.environ.get("BOOKING_HORIZON_DAYS", "7")
+    )
+    app.config["SLOT_CACHE_SIZE"] = int(os.environ.get("SLOT_CACHE_SIZE", "512"))
+    app.config["SLOT_CACHE_TTL"] = float(os.environ.get("SLOT_CACHE_TTL", "30"))
+    app.config["HISTORY_PAGE_SIZE"] = int(os.environ.get("HISTORY_PAGE_SIZE", "20"))
+    app.config["HISTORY_CACHE_TTL"] = float(os.environ.get("HISTORY_CACHE_TTL", "300"))
+    app.config["NOTIFICATION_SENDER"] = os.environ.get("NOTIFICATION_SENDER", "log")
+    app.config["JINJA_BYTECODE_CACHE_DIR"] = os.environ.get("JINJA_BYTECODE_CACHE_DIR")
+    app.config["FRAGMENT_CACHE_TTL"] = float(
+        os.environ.get("FRAGMENT_CACHE_TTL", "600")
+    )
+    app.config["USER_CACHE_TTL"] = float(os.environ.get("USER_CACHE_TTL", "30"))
+    if os.environ.get("SQL_STATEMENT_BUDGET"):
+        app.config["SQL_STATEMENT_BUDGET"] = int(os.environ["SQL_STATEMENT_BUDGET"])
+    app.config.update(config or {})
+    app.config.setdefault(
+        "SQLALCHEMY_ENGINE_OPTIONS",
+        database.engine_options(app.config["SQLALCHEMY_DATABASE_URI"]),
+    )
+
+    db.init_app(app)
+    database.init_app(app, db)
+    instrumentation.init_app(app)
+    fragments.init_app(app)
+    login_manager.init_app(app)
+
+    slot_cache.maxsize = app.config["SLOT_CACHE_SIZE"]
+    slot_cache.ttl = app.config["SLOT_CACHE_TTL"]
+    history_cache.ttl = app.config["HISTORY_CACHE_TTL"]
+    fragments.fragment_cache.ttl = app.config["FRAGMENT_CACHE_TTL"]
+    identity.identity_cache.ttl = app.config["USER_CACHE_TTL"]
+
+    for rule, options, view in VIEWS:
+        app.add_url_rule(rule, view_func=view, **options)
+    app.register_error_handler(404, page_not_found)
+    for command in cli.commands.values():
+        app.cli.add_command(command)
+    return app
+
+
+_default_app = None
+
+
+def __getattr__(name):
+    # `app:app` (gunicorn, flask --app app, the benchmarks) gets an app built
+    # on first use rather than at import, so create_app() callers build only
+    # their own.
+    global _default_app
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _default_app is None:
+        _default_app = create_app()
+    return _default_app
+
+
 if __name__ == "__main__":
+    app = create_app()
     with app.app_context():
-        db.create_all()
-        create_admin()
+        bootstrap()
     # Use configured debug flag (do not run production with debug=True).
     app.run(debug=app.config.get("DEBUG", False))
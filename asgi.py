@@ -0,0 +1,204 @@
+"""
+Optional async server for the read-only JSON API.
+
+    pip install -r requirements-asgi.txt
+    uvicorn asgi:app --workers 4 --port 8001
+
+GET /api/departments and GET /api/doctors are the busiest endpoints. Here they
+are served from an event loop, so a slow or idle client holds a coroutine
+instead of a whole sync gunicorn worker. The routes take the same query
+parameters and return the same bodies, ETags and Last-Modified headers as
+the Flask routes. Queries are built from the same models.py definitions and
+run through SQLAlchemy's asyncio extension: aiosqlite for SQLite, asyncpg for
+PostgreSQL.
+
+Run it next to the WSGI app and have the proxy send those GET paths here.
+Writes, logins and HTML pages stay with Flask. Both servers read the data
+versions that the writes bump, so they agree on ETags, and cached payloads
+are rebuilt after any write. Further read-only endpoints go in ROUTES.
+"""
+
+import json
+import os
+from contextlib import asynccontextmanager
+from urllib.parse import urlencode
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import (
+    http_date,
+    parse_accept_header,
+    parse_date,
+    parse_etags,
+    quote_etag,
+)
+
+import database
+import roster
+import versioning
+from http_cache import last_modified_header, payload_cache
+from models import DataVersion, Department, Doctor
+from pagination import (
+    InvalidCursor,
+    clamp_page_size,
+    decode_cursor,
+    keyset_bounds,
+    split_page,
+)
+
+# Flask's default instance folder, where relative SQLite paths live.
+INSTANCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance")
+
+
+def _dumps(value):
+    # Byte-for-byte what Flask's JSON provider produces for the same payload.
+    return json.dumps(value, sort_keys=True)
+
+
+def _error(message, status=400):
+    return JSONResponse({"error": message}, status_code=status)
+
+
+async def _validators(request, session, key, versions):
+    """Like http_cache.validators: (etag, headers, not_modified)."""
+    rows = await session.scalars(
+        select(DataVersion).where(DataVersion.name.in_(versions))
+    )
+    token, last_modified = versioning.summarize(versions, rows)
+    etag = f"{key}-{token}"
+    headers = {"ETag": quote_etag(etag), "Cache-Control": "no-cache"}
+    if last_modified_header(last_modified):
+        headers["Last-Modified"] = http_date(last_modified)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        not_modified = parse_etags(if_none_match).contains_weak(etag)
+    else:
+        since = parse_date(request.headers.get("if-modified-since"))
+        not_modified = since is not None and last_modified <= since
+    return etag, headers, not_modified
+
+
+async def _conditional_json(request, session, key, versions, build):
+    """Like http_cache.conditional_json, with an async `build`."""
+    etag, headers, not_modified = await _validators(request, session, key, versions)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    body = payload_cache.get((etag, key))
+    if body is None:
+        body = _dumps(await build()).encode()
+        payload_cache.set((etag, key), body)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+async def departments(request):
+    async with request.app.state.Session() as session:
+
+        async def build():
+            result = await session.execute(
+                select(Department.id, Department.name).order_by(Department.id)
+            )
+            return [{"id": d.id, "name": d.name} for d in result]
+
+        return await _conditional_json(
+            request, session, "departments", [versioning.DEPARTMENTS], build
+        )
+
+
+async def doctors(request):
+    """Doctor roster, with the parameters of the Flask api_get_doctors route."""
+    response = await _doctors(request)
+    # The Accept header can choose NDJSON over the JSON array.
+    response.headers["Vary"] = "Accept"
+    return response
+
+
+async def _doctors(request):
+    args = request.query_params
+    try:
+        fields = roster.parse_fields(args.get("fields"))
+        department_id = roster.parse_department_id(args.get("department_id"))
+    except roster.InvalidRosterQuery as exc:
+        return _error(str(exc))
+    qualification = args.get("qualification", "").strip()
+    query = roster.roster_select(department_id, qualification)
+
+    versions = [versioning.DOCTORS, versioning.DEPARTMENTS]
+    cache_key = "doctors?" + urlencode(sorted(args.multi_items()))
+    Session = request.app.state.Session
+
+    accept = parse_accept_header(request.headers.get("accept"), MIMEAccept)
+    if args.get("format") == "ndjson" or accept.best == "application/x-ndjson":
+        async with Session() as session:
+            _, headers, not_modified = await _validators(
+                request, session, cache_key + "|ndjson", versions
+            )
+        if not_modified:
+            return Response(status_code=304, headers=headers)
+
+        async def generate():
+            async with Session() as session:
+                result = await session.stream(
+                    query.order_by(Doctor.id).execution_options(
+                        yield_per=roster.STREAM_BATCH_SIZE
+                    )
+                )
+                async for row in result:
+                    yield _dumps(roster.serialize(row, fields)) + "\n"
+
+        return StreamingResponse(
+            generate(), media_type="application/x-ndjson", headers=headers
+        )
+
+    async with Session() as session:
+        if "limit" in args or "after" in args:
+            limit = clamp_page_size(args.get("limit"))
+            after = args.get("after")
+            try:
+                if after:
+                    decode_cursor(after, [Doctor.id])
+            except InvalidCursor as exc:
+                return _error(str(exc))
+
+            async def build():
+                page = keyset_bounds(query, [Doctor.id], after=after, limit=limit)
+                result = await session.execute(page)
+                rows, next_cursor = split_page(result.all(), [Doctor.id], limit)
+                items = [roster.serialize(row, fields) for row in rows]
+                return {"items": items, "next": next_cursor}
+
+        else:
+
+            async def build():
+                result = await session.execute(query.order_by(Doctor.id))
+                return [roster.serialize(row, fields) for row in result]
+
+        return await _conditional_json(request, session, cache_key, versions, build)
+
+
+ROUTES = [
+    Route("/api/departments", departments, methods=["GET"]),
+    Route("/api/doctors", doctors, methods=["GET"]),
+]
+
+
+def create_app(environ=os.environ, instance_path=INSTANCE_PATH):
+    """Build the ASGI app for DATABASE_URL (see database.py)."""
+    engine = database.async_engine(instance_path, environ)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await engine.dispose()
+
+    app = Starlette(routes=ROUTES, lifespan=lifespan)
+    app.state.Session = async_sessionmaker(engine, expire_on_commit=False)
+    return app
+
+
+app = create_app()
@@ -0,0 +1,134 @@
+"""
+Slot availability for a doctor's upcoming schedule.
+
+A doctor's weekly template (DoctorAvailability rows keyed by weekday) is
+expanded over a date window, with AvailabilityException rows replacing the
+template on the dates they cover, and matched against the appointments already
+booked inside that window. Only the window is queried, so the cost depends on
+the horizon rather than on how many appointments the doctor has ever had.
+"""
+
+from dataclasses import dataclass
+from datetime import date, time, timedelta
+
+from caching import LRUCache
+from models import (
+    HOLDING_STATUSES,
+    Appointment,
+    AvailabilityException,
+    DoctorAvailability,
+)
+
+DEFAULT_HORIZON_DAYS = 7
+
+# Computed slot grids keyed by (doctor_id, start_day, horizon_days).
+slot_cache = LRUCache(maxsize=512, ttl=30.0)
+
+
+@dataclass(frozen=True)
+class Slot:
+    date: date
+    start: time
+    end: time
+    is_taken: bool = False
+
+    @property
+    def date_str(self):
+        return self.date.strftime("%Y-%m-%d")
+
+    @property
+    def day_name(self):
+        return self.date.strftime("%A")
+
+
+def booked_times(doctor_id, first_day, last_day, exclude_appointment_id=None):
+    """Return {(date, time)} held by active appointments between the two days."""
+    query = Appointment.query.with_entities(
+        Appointment.date_scheduled, Appointment.time_scheduled
+    ).filter(
+        Appointment.doctor_id == doctor_id,
+        Appointment.date_scheduled >= first_day,
+        Appointment.date_scheduled <= last_day,
+        Appointment.status.in_(HOLDING_STATUSES),
+    )
+    if exclude_appointment_id is not None:
+        query = query.filter(Appointment.id != exclude_appointment_id)
+    return {(row.date_scheduled, row.time_scheduled) for row in query}
+
+
+def upcoming_slots(
+    doctor_id,
+    start_day=None,
+    horizon_days=DEFAULT_HORIZON_DAYS,
+    exclude_appointment_id=None,
+):
+    """
+    Expand the doctor's weekly schedule over `horizon_days` days from
+    `start_day` (today by default) and mark slots that are already booked.
+
+    `exclude_appointment_id` lets a reschedule treat its own current slot as
+    free.
+    """
+    start_day = start_day or date.today()
+    last_day = start_day + timedelta(days=horizon_days - 1)
+
+    weekly_schedule = (
+        DoctorAvailability.query.filter_by(doctor_id=doctor_id)
+        .order_by(DoctorAvailability.start_time)
+        .all()
+    )
+    exceptions = (
+        AvailabilityException.query.filter(
+            AvailabilityException.doctor_id == doctor_id,
+            AvailabilityException.date >= start_day,
+            AvailabilityException.date <= last_day,
+        )
+        .order_by(AvailabilityException.start_time)
+        .all()
+    )
+    if not weekly_schedule and not exceptions:
+        return []
+
+    schedule_map = {}
+    for entry in weekly_schedule:
+        schedule_map.setdefault(entry.day_of_week, []).append(entry)
+    exception_map = {}
+    for entry in exceptions:
+        hours = exception_map.setdefault(entry.date, [])
+        if entry.start_time is not None:
+            hours.append(entry)
+
+    booked = booked_times(
+        doctor_id, start_day, last_day, exclude_appointment_id=exclude_appointment_id
+    )
+
+    slots = []
+    for offset in range(horizon_days):
+        current_day = start_day + timedelta(days=offset)
+        if current_day in exception_map:
+            entries = exception_map[current_day]
+        else:
+            entries = schedule_map.get(current_day.strftime("%A"), [])
+        for entry in entries:
+            slots.append(
+                Slot(
+                    date=current_day,
+                    start=entry.start_time,
+                    end=entry.end_time,
+                    is_taken=(current_day, entry.start_time) in booked,
+                )
+            )
+    return slots
+
+
+def cached_upcoming_slots(doctor_id, horizon_days=DEFAULT_HORIZON_DAYS):
+    """upcoming_slots() from today, served from `slot_cache` when possible."""
+    key = (doctor_id, date.today(), horizon_days)
+    return slot_cache.get_or_set(
+        key, lambda: tuple(upcoming_slots(doctor_id, key[1], horizon_days))
+    )
+
+
+def invalidate_doctor_slots(doctor_id):
+    """Call after any write that changes a doctor's schedule or bookings."""
+    slot_cache.invalidate_matching(lambda key: key[0] == doctor_id)
@@ -0,0 +1,263 @@
+"""
+Read-only API throughput: sync gunicorn workers against the ASGI server.
+
+Both servers get the same number of worker processes and the same seeded
+database. Client processes keep `--connections` requests in flight for
+`--seconds`, cycling through /api/departments, the full /api/doctors list and
+a filtered, paged /api/doctors. Every request uses a fresh connection, as the
+sync workers do not keep connections alive.
+
+Each server is measured twice: once with only these clients, and once with
+`--slow-clients` extra connections that trickle their request headers for the
+whole run, like clients on a poor mobile network. A sync worker is blocked
+for as long as it reads one of those requests, while the event loop serves
+other connections in the meantime.
+
+    pip install -r requirements-asgi.txt
+    python -m benchmarks.api_concurrency --workers 4 --connections 64
+    python -m benchmarks.api_concurrency --slow-clients 0   # skip the slow runs
+"""
+
+import argparse
+import asyncio
+import http.client
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOCTORS = 300
+PATIENTS = 1000
+
+
+def seed():
+    import migrations
+    import synthetic
+    from app import create_app
+    from models import db
+
+    with create_app().app_context():
+        db.create_all()
+        migrations.upgrade(db.engine, echo=lambda _msg: None)
+        synthetic.generate(DOCTORS, PATIENTS, 0, echo=lambda _msg: None)
+
+
+def paths():
+    return [
+        "/api/departments",
+        "/api/doctors",
+        "/api/doctors?department_id=2&fields=id,name&limit=20",
+    ]
+
+
+def server_command(server, workers, port):
+    if server == "gunicorn":
+        return [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "-c",
+            os.path.join(ROOT, "gunicorn.conf.py"),
+            "--workers",
+            str(workers),
+            "--bind",
+            f"127.0.0.1:{port}",
+            "--log-level",
+            "warning",
+            "--preload",
+            "app:create_app()",
+        ]
+    return [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "asgi:app",
+        "--workers",
+        str(workers),
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(port),
+        "--log-level",
+        "warning",
+        "--no-access-log",
+    ]
+
+
+def start(server, workers, port, env):
+    proc = subprocess.Popen(server_command(server, workers, port), cwd=ROOT, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{server} exited during startup")
+        try:
+            for path in paths():
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+                conn.request("GET", path)
+                status = conn.getresponse().status
+                conn.close()
+                if status != 200:
+                    raise RuntimeError(f"{server} answered {path} with {status}")
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"{server} did not start within 60s")
+
+
+async def fetch(port, path, timeout):
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection("127.0.0.1", port), timeout
+    )
+    request = f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+    try:
+        writer.write(request.encode())
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    return int(response.split(b" ", 2)[1])
+
+
+async def slow_client(port, stop_at):
+    """Send one header line every 0.5s until the run ends, then finish."""
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /api/doctors HTTP/1.1\r\nHost: localhost\r\n")
+        while time.monotonic() < stop_at:
+            await asyncio.sleep(0.5)
+            writer.write(b"X-Slow: 1\r\n")
+            await writer.drain()
+        writer.write(b"Connection: close\r\n\r\n")
+        await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+    except (OSError, asyncio.TimeoutError):
+        pass
+
+
+async def drive(port, connections, slow, seconds, timeout):
+    stop_at = time.monotonic() + seconds
+    latencies, errors = [], 0
+
+    async def loop(offset):
+        nonlocal errors
+        urls = paths()
+        n = offset
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                status = await fetch(port, urls[n % len(urls)], timeout)
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+            n += 1
+
+    slow_tasks = [asyncio.create_task(slow_client(port, stop_at)) for _ in range(slow)]
+    # Let the slow clients connect first, so they hold on to workers.
+    await asyncio.sleep(0.2 if slow else 0)
+    await asyncio.gather(*(loop(i) for i in range(connections)))
+    await asyncio.gather(*slow_tasks)
+    return latencies, errors
+
+
+def client(port, connections, slow, seconds, timeout, results):
+    results.put(asyncio.run(drive(port, connections, slow, seconds, timeout)))
+
+
+def measure(port, args, slow):
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    procs = []
+    for n in range(args.client_procs):
+        # Spread connections and slow clients over the client processes.
+        share = len(range(n, args.connections, args.client_procs))
+        slow_share = len(range(n, slow, args.client_procs))
+        procs.append(
+            ctx.Process(
+                target=client,
+                args=(port, share, slow_share, args.seconds, args.timeout, results),
+            )
+        )
+    for proc in procs:
+        proc.start()
+    latencies, errors = [], 0
+    for _ in procs:
+        batch, failed = results.get()
+        latencies.extend(batch)
+        errors += failed
+    for proc in procs:
+        proc.join()
+
+    latencies.sort()
+
+    def pct(q):
+        if not latencies:
+            return float("nan")
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+
+    return {
+        "rps": len(latencies) / args.seconds,
+        "p50": pct(0.5),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+        "errors": errors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--slow-clients", type=int, help="[default: 2 x workers]")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--client-procs", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args(argv)
+    slow = 2 * args.workers if args.slow_clients is None else args.slow_clients
+
+    scratch = tempfile.TemporaryDirectory()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{scratch.name}/api.db",
+        PROMETHEUS_MULTIPROC_DIR=os.path.join(scratch.name, "metrics"),
+    )
+    os.makedirs(env["PROMETHEUS_MULTIPROC_DIR"])
+    os.environ["DATABASE_URL"] = env["DATABASE_URL"]
+    sys.path.insert(0, ROOT)
+    seeder = mp.get_context("spawn").Process(target=seed)
+    seeder.start()
+    seeder.join()
+
+    print(
+        f"workers={args.workers} connections={args.connections} "
+        f"seconds={args.seconds:g} doctors={DOCTORS}"
+    )
+    print(
+        f"{'server':<10}{'slow':>6}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'p99 ms':>9}{'errors':>8}"
+    )
+    for server in ("gunicorn", "uvicorn"):
+        proc = start(server, args.workers, args.port, env)
+        try:
+            for slow_clients in sorted({0, slow}):
+                row = measure(args.port, args, slow_clients)
+                print(
+                    f"{server:<10}{slow_clients:>6}{row['rps']:>10.0f}"
+                    f"{row['p50']:>9.1f}{row['p95']:>9.1f}{row['p99']:>9.1f}"
+                    f"{row['errors']:>8}"
+                )
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    scratch.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
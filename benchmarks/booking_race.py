@@ -0,0 +1,173 @@
+"""
+Concurrency stress test for appointment booking.
+
+Spawns several worker processes (like gunicorn workers), each with its own
+app, engine and patient login. In every round all workers wait on a barrier
+and then POST the same doctor/date/time to /book/<doctor_id>. Exactly one
+booking per round must succeed; the rest must get the "slot was just booked"
+redirect. The run exits non-zero if any round ends with more or fewer than
+one slot-holding appointment (models.HOLDING_STATUSES) for its slot.
+
+    python -m benchmarks.booking_race --workers 16 --rounds 50
+
+By default a throwaway SQLite database is used; pass --database-url to point
+at another server.
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from datetime import time as clock
+
+
+def slot_for_round(round_no):
+    # Spread rounds over distinct slots so each round is an independent race.
+    day = date.today() + timedelta(days=1 + round_no // 48)
+    minutes = (round_no % 48) * 15
+    return day, clock(minutes // 60, minutes % 60)
+
+
+def seed(workers):
+    from werkzeug.security import generate_password_hash
+
+    import migrations
+    from app import app
+    from models import Doctor, Patient, User, db
+
+    with app.app_context():
+        db.create_all()
+        migrations.upgrade(db.engine, echo=lambda _msg: None)
+
+        password = generate_password_hash("bench", method="pbkdf2:sha256")
+        doctor_user = User(username="race-doctor", password=password, role="doctor")
+        db.session.add(doctor_user)
+        db.session.flush()
+        doctor = Doctor(user_id=doctor_user.id, full_name="Race Doctor")
+        db.session.add(doctor)
+
+        patient_user_ids = []
+        for n in range(workers):
+            user = User(username=f"race-patient-{n}", password=password, role="patient")
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(Patient(user_id=user.id, full_name=f"Race Patient {n}"))
+            patient_user_ids.append(user.id)
+
+        db.session.commit()
+        return doctor.id, patient_user_ids
+
+
+def worker(user_id, doctor_id, rounds, barrier, results):
+    from app import app
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+
+    outcomes = []
+    started = None
+    for round_no in range(rounds):
+        day, start = slot_for_round(round_no)
+        barrier.wait()
+        started = started or time.perf_counter()
+        response = client.post(
+            f"/book/{doctor_id}",
+            data={"date": day.isoformat(), "time": start.strftime("%H:%M:%S")},
+        )
+        if response.status_code != 302:
+            outcomes.append((round_no, "error"))
+        elif response.headers["Location"].endswith("/patient_dashboard"):
+            outcomes.append((round_no, "booked"))
+        else:
+            outcomes.append((round_no, "conflict"))
+    results.put((outcomes, started, time.perf_counter()))
+
+
+def count_active(doctor_id, rounds):
+    """Slot-holding bookings per round, as the unique slot index counts them."""
+    from app import app
+    from models import HOLDING_STATUSES, Appointment
+
+    with app.app_context():
+        counts = []
+        for round_no in range(rounds):
+            day, start = slot_for_round(round_no)
+            counts.append(
+                Appointment.query.filter(
+                    Appointment.doctor_id == doctor_id,
+                    Appointment.date_scheduled == day,
+                    Appointment.time_scheduled == start,
+                    Appointment.status.in_(HOLDING_STATUSES),
+                ).count()
+            )
+        return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--database-url")
+    args = parser.parse_args(argv)
+
+    scratch = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        scratch = tempfile.TemporaryDirectory()
+        os.environ["DATABASE_URL"] = f"sqlite:///{scratch.name}/race.db"
+
+    doctor_id, user_ids = seed(args.workers)
+
+    # spawn, not fork: every worker builds its own app and connection pool.
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(args.workers)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=worker, args=(uid, doctor_id, args.rounds, barrier, results))
+        for uid in user_ids
+    ]
+    for proc in procs:
+        proc.start()
+    reports = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+
+    tally = {"booked": 0, "conflict": 0, "error": 0}
+    booked_per_round = [0] * args.rounds
+    for outcomes, _, _ in reports:
+        for round_no, outcome in outcomes:
+            tally[outcome] += 1
+            if outcome == "booked":
+                booked_per_round[round_no] += 1
+
+    elapsed = max(end for _, _, end in reports) - min(start for _, start, _ in reports)
+    attempts = args.workers * args.rounds
+    active = count_active(doctor_id, args.rounds)
+
+    print(f"workers={args.workers} rounds={args.rounds} attempts={attempts}")
+    print(
+        f"booked={tally['booked']} conflict={tally['conflict']} "
+        f"error={tally['error']}"
+    )
+    print(f"throughput={attempts / elapsed:.1f} booking requests/s")
+
+    bad_rounds = [
+        n for n in range(args.rounds) if booked_per_round[n] != 1 or active[n] != 1
+    ]
+    if scratch:
+        scratch.cleanup()
+    if bad_rounds:
+        print(f"FAIL: rounds without exactly one booking: {bad_rounds}")
+        return 1
+    print("OK: every slot was booked exactly once")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+Worker cold-start benchmark: how long until a fresh server answers.
+
+Modes:
+    in-process         import app, create_app() and serve the first request
+                       through the test client, in a fresh interpreter
+    gunicorn           gunicorn "app:create_app()" with N workers
+    gunicorn-preload   the same with --preload, so the app is built and
+                       warmed up once in the master before forking
+
+For the gunicorn modes the clock starts when the server process is launched.
+"first" is the time until the first successful response. "first wave" is
+the slowest of 4 x N concurrent requests sent right after that, which is
+roughly when every worker has served its first request. "PSS" is the
+proportional memory of the master plus workers, which shows how much is
+shared copy-on-write.
+
+    python -m benchmarks.cold_start --workers 4 --runs 3
+    python -m benchmarks.cold_start --cold-bytecode   # empty Jinja cache each start
+"""
+
+import argparse
+import http.client
+import multiprocessing as mp
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATH = "/login"
+
+
+def bootstrap():
+    from app import bootstrap, create_app
+
+    with create_app().app_context():
+        bootstrap(echo=lambda _msg: None)
+
+
+def in_process(results):
+    started = time.perf_counter()
+    from app import create_app
+
+    imported = time.perf_counter()
+    client = create_app().test_client()
+    created = time.perf_counter()
+    response = client.get(PATH)
+    first = time.perf_counter()
+    client.get(PATH)
+    second = time.perf_counter()
+    assert response.status_code == 200, response.status
+    results.put(
+        {
+            "import": imported - started,
+            "create_app": created - imported,
+            "first": first - started,
+            "second request": second - first,
+        }
+    )
+
+
+def _get(port, timeout=30):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        started = time.perf_counter()
+        conn.request("GET", PATH)
+        response = conn.getresponse()
+        response.read()
+        return response.status, time.perf_counter() - started
+    finally:
+        conn.close()
+
+
+def _pss_mib(pid):
+    total = 0
+    for proc in [pid] + _children(pid):
+        try:
+            with open(f"/proc/{proc}/smaps_rollup") as rollup:
+                for line in rollup:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1])
+        except OSError:
+            return None
+    return total / 1024
+
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            return [int(child) for child in children.read().split()]
+    except OSError:
+        return []
+
+
+def gunicorn(workers, preload, port):
+    args = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "-c",
+        os.path.join(ROOT, "gunicorn.conf.py"),
+        "--workers",
+        str(workers),
+        "--bind",
+        f"127.0.0.1:{port}",
+        "--log-level",
+        "warning",
+    ]
+    if preload:
+        args.append("--preload")
+    started = time.perf_counter()
+    proc = subprocess.Popen(args + ["app:create_app()"], cwd=ROOT)
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError("gunicorn exited during startup")
+            try:
+                status, _ = _get(port, timeout=5)
+            except OSError:
+                time.sleep(0.005)
+                continue
+            if status == 200:
+                break
+        first = time.perf_counter() - started
+        with ThreadPoolExecutor(workers * 4) as pool:
+            wave = list(pool.map(lambda _: _get(port)[1], range(workers * 4)))
+        return {
+            "first": first,
+            "first wave": max(wave),
+            "pss_mib": _pss_mib(proc.pid),
+        }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--cold-bytecode", action="store_true")
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.TemporaryDirectory()
+    bytecode_dir = os.path.join(scratch.name, "jinja")
+    os.environ["DATABASE_URL"] = f"sqlite:///{scratch.name}/cold_start.db"
+    os.environ["JINJA_BYTECODE_CACHE_DIR"] = bytecode_dir
+    sys.path.insert(0, ROOT)
+
+    ctx = mp.get_context("spawn")
+    seeder = ctx.Process(target=bootstrap)
+    seeder.start()
+    seeder.join()
+
+    rows = {"in-process": [], "gunicorn": [], "gunicorn-preload": []}
+    for _ in range(args.runs):
+        for mode in rows:
+            if args.cold_bytecode:
+                shutil.rmtree(bytecode_dir, ignore_errors=True)
+            if mode == "in-process":
+                results = ctx.Queue()
+                proc = ctx.Process(target=in_process, args=(results,))
+                proc.start()
+                rows[mode].append(results.get())
+                proc.join()
+            else:
+                preload = mode == "gunicorn-preload"
+                rows[mode].append(gunicorn(args.workers, preload, args.port))
+    scratch.cleanup()
+
+    def median(samples, key, scale=1000):
+        values = [s[key] for s in samples if s.get(key) is not None]
+        return f"{statistics.median(values) * scale:.0f}" if values else "-"
+
+    print(
+        f"workers={args.workers} runs={args.runs} "
+        f"bytecode cache={'cold' if args.cold_bytecode else 'warm after run 1'}"
+    )
+    samples = rows["in-process"]
+    print(
+        f"in-process: import {median(samples, 'import')} ms, "
+        f"create_app {median(samples, 'create_app')} ms, "
+        f"first request done at {median(samples, 'first')} ms, "
+        f"second request {median(samples, 'second request', 1e6)} us"
+    )
+    print(f"{'mode':<18}{'first ms':>10}{'first wave ms':>15}{'PSS MiB':>10}")
+    for mode in ("gunicorn", "gunicorn-preload"):
+        samples = rows[mode]
+        print(
+            f"{mode:<18}{median(samples, 'first'):>10}"
+            f"{median(samples, 'first wave'):>15}"
+            f"{median(samples, 'pss_mib', 1):>10}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+Mixed read/write throughput across database configurations.
+
+Each mode gets a fresh seeded database and the same workload: several worker
+processes (like gunicorn workers) loop for a fixed time, mostly reading a
+doctor's upcoming appointments with their patients and sometimes booking a new
+appointment. Throughput, "database is locked"/other errors and p95 latency
+are reported per mode.
+
+    python -m benchmarks.db_throughput --workers 8 --seconds 10
+    python -m benchmarks.db_throughput --postgres-url postgresql://... --yes-drop
+
+Seeding DROPS EVERY TABLE in the target database. The SQLite modes use fresh
+files in a temporary directory. A --postgres-url database that already has
+tables is refused unless --yes-drop is given, so point it at a scratch
+database.
+
+Modes:
+    sqlite-default  rollback journal, synchronous=FULL, no mmap (the old setup)
+    sqlite-wal      the tuned settings from database.py
+    postgres        pooled server database, only when --postgres-url is given
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from datetime import time as clock
+
+MODES = {
+    "sqlite-default": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_MMAP_SIZE": "0",
+    },
+    "sqlite-wal": {},
+}
+
+DOCTORS = 20
+PATIENTS = 200
+APPOINTMENTS = 5000
+
+
+def seed(allow_drop):
+    from sqlalchemy import inspect
+
+    import migrations
+    from app import app
+    from models import Appointment, Doctor, Patient, User, db
+
+    rng = random.Random(1)
+    today = date.today()
+    with app.app_context():
+        tables = inspect(db.engine).get_table_names()
+        if tables and not allow_drop:
+            sys.exit(
+                f"{db.engine.url!r} already has {len(tables)} tables; seeding "
+                f"would drop them. Use a scratch database or pass --yes-drop."
+            )
+        db.drop_all()
+        db.create_all()
+        migrations.upgrade(db.engine, echo=lambda _msg: None)
+        conn = db.session.connection()
+        conn.execute(
+            User.__table__.insert(),
+            [
+                {"id": n, "username": f"user{n}", "password": "x", "role": "patient"}
+                for n in range(1, DOCTORS + PATIENTS + 1)
+            ],
+        )
+        conn.execute(
+            Doctor.__table__.insert(),
+            [
+                {"id": n, "user_id": n, "full_name": f"Doctor {n}"}
+                for n in range(1, DOCTORS + 1)
+            ],
+        )
+        conn.execute(
+            Patient.__table__.insert(),
+            [
+                {"id": n, "user_id": DOCTORS + n, "full_name": f"Patient {n}"}
+                for n in range(1, PATIENTS + 1)
+            ],
+        )
+        conn.execute(
+            Appointment.__table__.insert(),
+            [
+                {
+                    "patient_id": rng.randint(1, PATIENTS),
+                    "doctor_id": 1 + n % DOCTORS,
+                    "date_scheduled": today + timedelta(days=n // 400 - 6),
+                    "time_scheduled": clock((n // DOCTORS) % 20, 0),
+                    "status": "Scheduled",
+                }
+                for n in range(APPOINTMENTS)
+            ],
+        )
+        db.session.commit()
+
+
+def worker(worker_no, seconds, write_ratio, barrier, results):
+    from sqlalchemy.exc import IntegrityError, OperationalError
+    from sqlalchemy.orm import joinedload
+
+    from app import app
+    from models import Appointment, db
+
+    rng = random.Random(worker_no)
+    today = date.today()
+    reads = writes = locked = conflicts = 0
+    latencies = []
+    booking_no = 0
+
+    with app.app_context():
+        barrier.wait()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                if rng.random() < write_ratio:
+                    # Far-future slots unique to this worker: never conflicts.
+                    booking_no += 1
+                    db.session.add(
+                        Appointment(
+                            patient_id=rng.randint(1, PATIENTS),
+                            doctor_id=1 + worker_no % DOCTORS,
+                            date_scheduled=today
+                            + timedelta(days=400 + booking_no // 96),
+                            time_scheduled=clock(
+                                (booking_no % 96) // 4, (booking_no % 4) * 15
+                            ),
+                            status="Scheduled",
+                        )
+                    )
+                    db.session.commit()
+                    writes += 1
+                else:
+                    Appointment.query.options(joinedload(Appointment.patient)).filter(
+                        Appointment.doctor_id == rng.randint(1, DOCTORS),
+                        Appointment.date_scheduled >= today,
+                        Appointment.date_scheduled <= today + timedelta(days=7),
+                    ).all()
+                    reads += 1
+            except OperationalError:
+                db.session.rollback()
+                locked += 1
+            except IntegrityError:
+                db.session.rollback()
+                conflicts += 1
+            latencies.append(time.perf_counter() - started)
+            db.session.remove()
+
+    results.put((reads, writes, locked, conflicts, latencies))
+
+
+def run_mode(name, env, args):
+    saved = dict(os.environ)
+    os.environ.update(env)
+    ctx = mp.get_context("spawn")
+    try:
+        seeder = ctx.Process(target=seed, args=(args.yes_drop,))
+        seeder.start()
+        seeder.join()
+        if seeder.exitcode:
+            raise RuntimeError(f"seeding failed for {name}")
+
+        barrier = ctx.Barrier(args.workers)
+        results = ctx.Queue()
+        procs = [
+            ctx.Process(
+                target=worker,
+                args=(n, args.seconds, args.write_ratio, barrier, results),
+            )
+            for n in range(args.workers)
+        ]
+        for proc in procs:
+            proc.start()
+        reports = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+
+    reads = sum(r[0] for r in reports)
+    writes = sum(r[1] for r in reports)
+    locked = sum(r[2] for r in reports)
+    conflicts = sum(r[3] for r in reports)
+    latencies = sorted(x for r in reports for x in r[4])
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0
+    return {
+        "mode": name,
+        "ops/s": (reads + writes) / args.seconds,
+        "reads": reads,
+        "writes": writes,
+        "errors": locked + conflicts,
+        "p95 ms": p95,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--postgres-url")
+    parser.add_argument(
+        "--yes-drop",
+        action="store_true",
+        help="Drop the tables of a --postgres-url database that already has some.",
+    )
+    args = parser.parse_args(argv)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as scratch:
+        for name, env in MODES.items():
+            url = f"sqlite:///{scratch}/{name}.db"
+            rows.append(run_mode(name, dict(env, DATABASE_URL=url), args))
+        if args.postgres_url:
+            rows.append(run_mode("postgres", {"DATABASE_URL": args.postgres_url}, args))
+
+    print(
+        f"workers={args.workers} seconds={args.seconds} "
+        f"write_ratio={args.write_ratio}"
+    )
+    print(
+        f"{'mode':<16}{'ops/s':>10}{'reads':>9}{'writes':>9}{'errors':>8}{'p95 ms':>9}"
+    )
+    for row in rows:
+        print(
+            f"{row['mode']:<16}{row['ops/s']:>10.1f}{row['reads']:>9}"
+            f"{row['writes']:>9}{row['errors']:>8}{row['p95 ms']:>9.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,607 @@
+"""
+Route latency benchmark with regression thresholds.
+
+Seeds a synthetic hospital, then requests every major page and API route:
+first in-process through the Flask test client, and with --gunicorn N also
+over HTTP against a real N-worker gunicorn server with concurrent clients.
+For each route it reports p50/p95/p99 latency, the median number of SQL
+statements per request and the peak RSS reached while serving the route
+(in this process, or the largest gunicorn worker).
+
+    python -m benchmarks.routes
+    python -m benchmarks.routes --preset large --gunicorn 4 --db /tmp/bench.db
+    python -m benchmarks.routes --save-baseline
+    python -m benchmarks.routes --margin 0.25
+
+With --save-baseline the results are written to the baseline file
+(benchmarks/routes_baseline.json by default). Otherwise, if that file exists,
+every route is compared against it and the run exits non-zero when p95
+latency or peak RSS grew by more than --margin, or a route issues more SQL
+statements than before. Baselines depend on the machine, so record one on
+the machine that runs the comparison. Seeding the large preset takes a few
+minutes; pass --db to keep the database and reuse it on later runs.
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "routes_baseline.json")
+PASSWORD = "bench"
+ADMIN = "bench-admin"
+
+PRESETS = {
+    "small": {"doctors": 20, "patients": 2000, "appointments": 20000},
+    "medium": {"doctors": 100, "patients": 20000, "appointments": 200000},
+    "large": {"doctors": 500, "patients": 100000, "appointments": 2000000},
+}
+
+
+def seed(dataset):
+    """Build the dataset with the same generator as `flask seed`."""
+    from werkzeug.security import generate_password_hash
+
+    import migrations
+    import synthetic
+    from app import app
+    from models import Admin, User, db
+
+    with app.app_context():
+        db.create_all()
+        migrations.upgrade(db.engine, echo=lambda _msg: None)
+        synthetic.generate(
+            dataset["doctors"],
+            dataset["patients"],
+            dataset["appointments"],
+            rng_seed=dataset["seed"],
+            password=PASSWORD,
+            # The routes show today's schedule and the last month's stats.
+            anchor_date=date.today(),
+            echo=lambda _msg: None,
+        )
+        password = generate_password_hash(PASSWORD, method="pbkdf2:sha256")
+        admin = User(username=ADMIN, password=password, role="admin")
+        db.session.add(admin)
+        db.session.flush()
+        db.session.add(Admin(user_id=admin.id, full_name="Benchmark Admin"))
+        db.session.commit()
+
+
+def dataset_ids():
+    """Users and records the routes are exercised with."""
+    from app import app
+    from models import Appointment, Doctor, Patient, db
+
+    with app.app_context():
+        doctor = Doctor.query.order_by(Doctor.id).first()
+        visit = (
+            Appointment.query.filter_by(doctor_id=doctor.id, status="Completed")
+            .order_by(Appointment.id)
+            .first()
+        )
+        patient = db.session.get(Patient, visit.patient_id)
+        return {
+            "doctor": doctor.id,
+            "doctor_user": doctor.user.username,
+            "department": doctor.department_id,
+            "patient": patient.id,
+            "patient_user": patient.user.username,
+        }
+
+
+def routes(ids):
+    """(name, endpoint, role, method, path, form) for every benchmarked route."""
+    today = date.today()
+    last_month = {"start": (today - timedelta(days=30)).isoformat()}
+    return [
+        (
+            "admin dashboard",
+            "admin_dashboard",
+            "admin",
+            "GET",
+            "/admin_dashboard",
+            None,
+        ),
+        (
+            "admin dashboard search",
+            "admin_dashboard",
+            "admin",
+            "GET",
+            "/admin_dashboard?q=patient",
+            None,
+        ),
+        (
+            "admin appointments api",
+            "api_admin_appointments",
+            "admin",
+            "GET",
+            "/api/admin/appointments",
+            None,
+        ),
+        (
+            "admin search api",
+            "api_admin_search",
+            "admin",
+            "GET",
+            "/api/admin/search?q=doc",
+            None,
+        ),
+        (
+            "stats api",
+            "api_stats",
+            "admin",
+            "GET",
+            "/api/stats?" + urlencode(last_month),
+            None,
+        ),
+        (
+            "admin patient history",
+            "admin_view_history",
+            "admin",
+            "GET",
+            f"/admin_view_history/{ids['patient']}",
+            None,
+        ),
+        (
+            "departments api",
+            "api_get_departments",
+            "admin",
+            "GET",
+            "/api/departments",
+            None,
+        ),
+        ("doctors api", "api_get_doctors", "admin", "GET", "/api/doctors", None),
+        (
+            "doctor dashboard",
+            "doctor_dashboard",
+            "doctor",
+            "GET",
+            "/doctor_dashboard",
+            None,
+        ),
+        (
+            "doctor patient history",
+            "doctor_view_history",
+            "doctor",
+            "GET",
+            f"/doctor_view_history/{ids['patient']}",
+            None,
+        ),
+        (
+            "record search",
+            "search_records",
+            "doctor",
+            "GET",
+            "/records/search?q=flu",
+            None,
+        ),
+        (
+            "patient dashboard",
+            "patient_dashboard",
+            "patient",
+            "GET",
+            "/patient_dashboard",
+            None,
+        ),
+        (
+            "department page",
+            "view_department",
+            "patient",
+            "GET",
+            f"/department/{ids['department']}",
+            None,
+        ),
+        (
+            "booking page",
+            "book_appointment",
+            "patient",
+            "GET",
+            f"/book/{ids['doctor']}",
+            None,
+        ),
+        (
+            "book appointment",
+            "book_appointment",
+            "patient",
+            "POST",
+            f"/book/{ids['doctor']}",
+            booking_form,
+        ),
+        (
+            "patient history api",
+            "api_patient_history",
+            "patient",
+            "GET",
+            f"/api/patients/{ids['patient']}/history",
+            None,
+        ),
+    ]
+
+
+_bookings = itertools.count()
+_bookings_lock = threading.Lock()
+
+
+def booking_form():
+    """A distinct far-future slot per call, so every booking succeeds."""
+    with _bookings_lock:
+        n = next(_bookings)
+    day = date.today() + timedelta(days=1000 + n // 48)
+    minutes = (n % 48) * 15
+    return {
+        "date": day.isoformat(),
+        "time": f"{minutes // 60:02d}:{minutes % 60:02d}:00",
+    }
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def summarize(latencies, statements, rss):
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "sql": statistics.median(statements) if statements else None,
+        "rss_mib": rss,
+    }
+
+
+def reset_peak_rss(pid="self"):
+    # Writing 5 to clear_refs resets VmHWM (Linux); elsewhere the peak is
+    # simply the process's lifetime peak.
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as refs:
+            refs.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mib(pid="self"):
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid == "self":
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return None
+
+
+def run_client(ids, requests_per_route, warmup):
+    """Drive every route in-process through the Flask test client."""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    from app import app
+    from models import User
+
+    counter = {"statements": 0}
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        counter["statements"] += 1
+
+    event.listen(Engine, "before_cursor_execute", count)
+    clients = {}
+    with app.app_context():
+        for role, username in (
+            ("admin", ADMIN),
+            ("doctor", ids["doctor_user"]),
+            ("patient", ids["patient_user"]),
+        ):
+            user = User.query.filter_by(username=username).one()
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session["_user_id"] = str(user.id)
+                session["_fresh"] = True
+            clients[role] = client
+
+    results = {}
+    try:
+        for name, _endpoint, role, method, path, form in routes(ids):
+            client = clients[role]
+            for _ in range(warmup):
+                client.open(path, method=method, data=form() if form else None)
+            reset_peak_rss()
+            latencies, statements = [], []
+            for _ in range(requests_per_route):
+                data = form() if form else None
+                before = counter["statements"]
+                started = time.perf_counter()
+                response = client.open(path, method=method, data=data)
+                latencies.append(time.perf_counter() - started)
+                statements.append(counter["statements"] - before)
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{name}: {method} {path} -> {response.status}")
+            results[name] = summarize(latencies, statements, peak_rss_mib())
+    finally:
+        event.remove(Engine, "before_cursor_execute", count)
+    return results
+
+
+def login_cookie(port, username):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    conn.request(
+        "POST",
+        "/login",
+        body=urlencode({"username": username, "password": PASSWORD}),
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    cookie = response.getheader("Set-Cookie")
+    if response.status != 302 or not cookie:
+        raise RuntimeError(f"login as {username} failed: {response.status}")
+    return cookie.split(";", 1)[0]
+
+
+def sql_totals(port):
+    """{endpoint: (statement sum, request count)} from the merged /metrics."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    conn.request("GET", "/metrics")
+    body = conn.getresponse().read().decode()
+    conn.close()
+    totals = {}
+    slots = {
+        "http_request_sql_statements_sum": 0,
+        "http_request_sql_statements_count": 1,
+    }
+    for line in body.splitlines():
+        metric, _, rest = line.partition("{")
+        if metric in slots:
+            labels, value = rest.rsplit("} ", 1)
+            endpoint = labels.split('endpoint="', 1)[1].split('"', 1)[0]
+            totals.setdefault(endpoint, [0.0, 0.0])[slots[metric]] += float(value)
+    return totals
+
+
+def worker_pids(master_pid):
+    try:
+        with open(f"/proc/{master_pid}/task/{master_pid}/children") as children:
+            return [int(pid) for pid in children.read().split()]
+    except OSError:
+        return []
+
+
+def start_gunicorn(workers, port, env):
+    proc = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "-c",
+            os.path.join(ROOT, "gunicorn.conf.py"),
+            "--workers",
+            str(workers),
+            "--bind",
+            f"127.0.0.1:{port}",
+            "--log-level",
+            "warning",
+            "app:app",
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/login")
+            conn.getresponse().read()
+            conn.close()
+            if len(worker_pids(proc.pid)) >= workers or not sys.platform.startswith(
+                "linux"
+            ):
+                return proc
+        except OSError:
+            pass
+        if proc.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("gunicorn did not start within 60s")
+
+
+def run_gunicorn(ids, workers, concurrency, requests_per_route, warmup, port):
+    """Drive every route over HTTP against a multi-worker gunicorn server."""
+    metrics_dir = tempfile.TemporaryDirectory()
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=metrics_dir.name)
+    proc = start_gunicorn(workers, port, env)
+    results = {}
+    try:
+        cookies = {
+            "admin": login_cookie(port, ADMIN),
+            "doctor": login_cookie(port, ids["doctor_user"]),
+            "patient": login_cookie(port, ids["patient_user"]),
+        }
+        local = threading.local()
+
+        def fetch(role, method, path, form):
+            conn = getattr(local, "conn", None)
+            if conn is None:
+                conn = local.conn = http.client.HTTPConnection(
+                    "127.0.0.1", port, timeout=60
+                )
+            headers = {"Cookie": cookies[role]}
+            body = None
+            if form:
+                body = urlencode(form())
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+            started = time.perf_counter()
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            elapsed = time.perf_counter() - started
+            if response.status >= 400:
+                raise RuntimeError(f"{method} {path} -> {response.status}")
+            return elapsed
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            for name, endpoint, role, method, path, form in routes(ids):
+                warm = [role, method, path, form]
+                list(pool.map(lambda _: fetch(*warm), range(warmup)))
+                pids = worker_pids(proc.pid)
+                for pid in pids:
+                    reset_peak_rss(pid)
+                before = sql_totals(port).get(endpoint, [0.0, 0.0])
+                latencies = list(
+                    pool.map(lambda _: fetch(*warm), range(requests_per_route))
+                )
+                after = sql_totals(port).get(endpoint, [0.0, 0.0])
+                served = after[1] - before[1]
+                sql = [(after[0] - before[0]) / served] if served else []
+                rss = [peak_rss_mib(pid) for pid in pids]
+                rss = max((r for r in rss if r is not None), default=None)
+                results[name] = summarize(latencies, sql, rss)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+        metrics_dir.cleanup()
+    return results
+
+
+def compare(results, baseline, margin, min_delta_ms):
+    """Return a list of regressions against the baseline."""
+    failures = []
+    for mode, routes_now in results.items():
+        for name, now in routes_now.items():
+            before = baseline.get(mode, {}).get(name)
+            if before is None:
+                continue
+            limit = before["p95_ms"] * (1 + margin)
+            if now["p95_ms"] > max(limit, before["p95_ms"] + min_delta_ms):
+                failures.append(
+                    f"{mode} {name}: p95 {now['p95_ms']:.1f} ms, "
+                    f"baseline {before['p95_ms']:.1f} ms"
+                )
+            if before.get("sql") is not None and now["sql"] is not None:
+                if now["sql"] > before["sql"]:
+                    failures.append(
+                        f"{mode} {name}: {now['sql']:g} SQL statements, "
+                        f"baseline {before['sql']:g}"
+                    )
+            if before.get("rss_mib") and now["rss_mib"]:
+                if now["rss_mib"] > before["rss_mib"] * (1 + margin):
+                    failures.append(
+                        f"{mode} {name}: peak RSS {now['rss_mib']:.0f} MiB, "
+                        f"baseline {before['rss_mib']:.0f} MiB"
+                    )
+    return failures
+
+
+def report(mode, results):
+    print(f"\n[{mode}]")
+    print(
+        f"{'route':<26}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'sql':>7}{'rss MiB':>9}"
+    )
+    for name, row in results.items():
+        sql = "-" if row["sql"] is None else f"{row['sql']:g}"
+        rss = "-" if row["rss_mib"] is None else f"{row['rss_mib']:.0f}"
+        print(
+            f"{name:<26}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}"
+            f"{row['p99_ms']:>9.1f}{sql:>7}{rss:>9}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--preset", choices=PRESETS, default="small")
+    parser.add_argument("--doctors", type=int)
+    parser.add_argument("--patients", type=int)
+    parser.add_argument("--appointments", type=int)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", help="SQLite file to seed once and reuse.")
+    parser.add_argument("--requests", type=int, default=100, help="Per route.")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--gunicorn", type=int, metavar="WORKERS", default=0)
+    parser.add_argument("--concurrency", type=int, help="[default: 2 x workers]")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--margin", type=float, default=0.2)
+    parser.add_argument("--min-delta-ms", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    dataset = dict(PRESETS[args.preset], seed=args.seed)
+    for key in ("doctors", "patients", "appointments"):
+        if getattr(args, key):
+            dataset[key] = getattr(args, key)
+
+    scratch = tempfile.TemporaryDirectory()
+    path = os.path.abspath(args.db or os.path.join(scratch.name, "routes.db"))
+    fresh = not os.path.exists(path)
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    sys.path.insert(0, ROOT)
+
+    if fresh:
+        started = time.perf_counter()
+        seed(dataset)
+        print(f"seeded {dataset} in {time.perf_counter() - started:.1f}s")
+    else:
+        print(f"reusing {path}; assuming it holds {dataset}")
+    ids = dataset_ids()
+
+    results = {"client": run_client(ids, args.requests, args.warmup)}
+    report("client", results["client"])
+    if args.gunicorn:
+        results["gunicorn"] = run_gunicorn(
+            ids,
+            args.gunicorn,
+            args.concurrency or 2 * args.gunicorn,
+            args.requests,
+            args.warmup,
+            args.port,
+        )
+        report(f"gunicorn x{args.gunicorn}", results["gunicorn"])
+    scratch.cleanup()
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as out:
+            json.dump(dict(results, dataset=dataset), out, indent=2, sort_keys=True)
+        print(f"\nbaseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("\nno baseline to compare against; run with --save-baseline")
+        return 0
+
+    with open(args.baseline) as saved:
+        baseline = json.load(saved)
+    if baseline.get("dataset") != dataset:
+        print(f"\nbaseline was recorded for {baseline.get('dataset')}, not {dataset}")
+        return 2
+    failures = compare(results, baseline, args.margin, args.min_delta_ms)
+    if failures:
+        print(f"\nFAIL: {len(failures)} regressions beyond {args.margin:.0%}:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print(f"\nOK: every route is within {args.margin:.0%} of the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Small in-process caches.
+
+Each gunicorn worker keeps its own copy, so entries carry a TTL: writes made
+through another worker are picked up once the entry expires, while writes in
+this worker invalidate the affected keys immediately.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU mapping whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=256, ttl=30.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        # Keys being computed by get_or_set: key -> [computations, generation].
+        self._computing = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        self._data[key] = (self._clock() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_set(self, key, compute):
+        """
+        Cached value for `key`, computing and storing it on a miss. A value
+        whose key is invalidated while it is being computed may be stale, so
+        it is returned but not stored.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            computing = self._computing.setdefault(key, [0, 0])
+            computing[0] += 1
+            generation = computing[1]
+        stored = False
+        try:
+            value = compute()
+            stored = True
+        finally:
+            with self._lock:
+                computing = self._computing[key]
+                computing[0] -= 1
+                if not computing[0]:
+                    del self._computing[key]
+                if stored and computing[1] == generation:
+                    self._store(key, value)
+        return value
+
+    def _bump(self, key):
+        computing = self._computing.get(key)
+        if computing is not None:
+            computing[1] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._bump(key)
+            if self._data.pop(key, _MISSING) is not _MISSING:
+                self.invalidations += 1
+
+    def invalidate_matching(self, predicate):
+        """Drop every key for which `predicate(key)` is true."""
+        with self._lock:
+            for key in self._computing:
+                if predicate(key):
+                    self._bump(key)
+            doomed = [key for key in self._data if predicate(key)]
+            for key in doomed:
+                del self._data[key]
+            self.invalidations += len(doomed)
+
+    def clear(self):
+        with self._lock:
+            for key in self._computing:
+                self._bump(key)
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,124 @@
+"""
+Database connection settings, read from the environment.
+
+DATABASE_URL selects the backend (SQLite file by default). For SQLite every
+new connection is tuned with pragmas so concurrent gunicorn workers do not
+trip over each other: WAL lets readers proceed while a writer commits,
+busy_timeout makes a blocked writer wait instead of failing with "database is
+locked", synchronous=NORMAL is durable under WAL with far fewer fsyncs, and
+mmap_size serves reads straight from the page cache.
+
+For server databases (e.g. PostgreSQL) each worker gets a bounded connection
+pool with pre-ping, so connections dropped by the server or a proxy are
+replaced transparently. Keep workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) below
+the server's connection limit.
+"""
+
+import os
+
+from sqlalchemy import event, make_url
+
+DEFAULT_URL = "sqlite:///hospital.db"
+
+# Async drivers for the optional ASGI API (asgi.py), by backend.
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def _env_int(environ, name, default):
+    return int(environ.get(name, default))
+
+
+def database_url(environ=os.environ):
+    url = environ.get("DATABASE_URL", DEFAULT_URL)
+    # Heroku/Render style URLs use the scheme SQLAlchemy dropped in 1.4.
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url.split("://", 1)[1]
+    return url
+
+
+def async_database_url(url, instance_path):
+    """
+    `url` with the async driver for its backend. A relative SQLite path is
+    resolved against `instance_path`, as Flask-SQLAlchemy does.
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for {backend} databases")
+    database = url.database
+    if backend == "sqlite" and database and database != ":memory:":
+        url = url.set(database=os.path.join(instance_path, database))
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def sqlite_pragmas(environ=os.environ):
+    return {
+        "journal_mode": environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+        "busy_timeout": _env_int(environ, "SQLITE_BUSY_TIMEOUT_MS", 5000),
+        "synchronous": environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "mmap_size": _env_int(environ, "SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+    }
+
+
+def engine_options(url, environ=os.environ):
+    """SQLALCHEMY_ENGINE_OPTIONS for the given URL."""
+    if url.startswith("sqlite"):
+        busy_timeout_ms = sqlite_pragmas(environ)["busy_timeout"]
+        return {"connect_args": {"timeout": busy_timeout_ms / 1000}}
+
+    return {
+        "pool_size": _env_int(environ, "DB_POOL_SIZE", 5),
+        "max_overflow": _env_int(environ, "DB_MAX_OVERFLOW", 5),
+        "pool_timeout": _env_int(environ, "DB_POOL_TIMEOUT", 10),
+        "pool_recycle": _env_int(environ, "DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": True,
+    }
+
+
+def _apply_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return on_connect
+
+
+def init_app(app, db):
+    """Install the SQLite pragma hook on the engines `db` built for `app`."""
+    app.config.setdefault("SQLITE_PRAGMAS", sqlite_pragmas())
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == "sqlite":
+                event.listen(
+                    engine, "connect", _apply_pragmas(app.config["SQLITE_PRAGMAS"])
+                )
+
+
+def dispose_after_fork(app, db):
+    """
+    Drop pooled connections inherited from a parent process (gunicorn
+    --preload), so no two workers ever share a database connection.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def async_engine(instance_path, environ=os.environ):
+    """An AsyncEngine for DATABASE_URL with the same pool settings and pragmas."""
+    # Imported here so WSGI workers and CLI commands never load the async stack.
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = database_url(environ)
+    engine = create_async_engine(
+        async_database_url(url, instance_path), **engine_options(url, environ)
+    )
+    if engine.dialect.name == "sqlite":
+        event.listen(
+            engine.sync_engine, "connect", _apply_pragmas(sqlite_pragmas(environ))
+        )
+    return engine
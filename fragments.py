@@ -0,0 +1,72 @@
+"""
+Caching for rendered templates.
+
+Jinja bytecode cache: compiled templates are written to
+JINJA_BYTECODE_CACHE_DIR. Every gunicorn worker, including ones started after
+a restart, loads that code instead of parsing and compiling the source again.
+Entries are keyed by a checksum of the template source, so an edited template
+is recompiled on its next use. Writes go through a temporary file and a
+rename, so workers sharing the directory never read half-written entries.
+Loading bytecode runs it, so the directory must only be writable by the user
+the app runs as. By default Jinja's own per-user directory in the temp folder
+is used, which Jinja creates with mode 0700 and refuses if another user owns
+it. A configured directory is created with mode 0700 as well.
+
+Fragment cache: templates can cache part of their output.
+
+    {% call cached_fragment("department-doctors", dept.id, versions=["doctors"]) %}
+        ...
+    {% endcall %}
+
+The rendered HTML is kept per worker, keyed by the fragment name, the extra
+key parts and the current data versions (see versioning.py). The admin
+routes and the API bump those versions whenever a Department or Doctor row
+changes, so every worker renders the fragment again on its next request
+after a write. Fragments must not depend on the current user, the request
+or flashed messages. Anything the fragment needs should be loaded lazily
+(an unexecuted query or a lazy relationship), so a hit skips the database
+work as well as the rendering.
+"""
+
+import os
+
+from flask import g, has_request_context
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+import versioning
+from caching import LRUCache
+
+fragment_cache = LRUCache(maxsize=512, ttl=600.0)
+
+
+def _version_token(versions):
+    if not versions:
+        return ""
+    names = tuple(versions)
+    # One lookup per set of versions per request, however many fragments use it.
+    memo = g.setdefault("fragment_versions", {}) if has_request_context() else {}
+    if names not in memo:
+        memo[names] = versioning.current(*names)[0]
+    return memo[names]
+
+
+def cached_fragment(name, *key, versions=(), caller):
+    """Template global: render the `{% call %}` body once per key and version."""
+    cache_key = (name, key, _version_token(versions))
+    return fragment_cache.get_or_set(cache_key, lambda: Markup(caller()))
+
+
+def init_app(app):
+    """
+    JINJA_BYTECODE_CACHE_DIR: None (the default) for Jinja's private per-user
+    directory, a path, or "" to turn the bytecode cache off.
+    """
+    app.config.setdefault("JINJA_BYTECODE_CACHE_DIR", None)
+    directory = app.config["JINJA_BYTECODE_CACHE_DIR"]
+    if directory is None:
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+    elif directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    app.jinja_env.globals["cached_fragment"] = cached_fragment
@@ -0,0 +1,65 @@
+"""
+Gunicorn settings, picked up automatically from the working directory.
+
+Each worker records Prometheus samples in PROMETHEUS_MULTIPROC_DIR so /metrics
+can merge them across workers. The directory must exist before the app is
+imported and hold no samples from a previous run, or old counters would be
+added to the new ones. Without the variable a fresh private directory is
+created for every master start and removed on exit. A configured directory
+is reused, and only its *.db sample files are removed.
+
+With --preload (as in render.yaml) the app is built once in the master.
+Templates and ORM mappers are then warmed up there, so every forked worker
+starts with them already in memory, shared copy-on-write. Each worker then
+drops any database connections it inherited from the master.
+"""
+
+import glob
+import os
+import shutil
+import tempfile
+
+created_metrics_dir = None
+if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    os.makedirs(metrics_dir, exist_ok=True)
+    for sample_file in glob.glob(os.path.join(metrics_dir, "*.db")):
+        os.remove(sample_file)
+else:
+    metrics_dir = created_metrics_dir = tempfile.mkdtemp(
+        prefix="barejahospitals-metrics-"
+    )
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+
+
+def on_exit(server):
+    # Only a directory this config created itself is ever deleted.
+    if created_metrics_dir:
+        shutil.rmtree(created_metrics_dir, ignore_errors=True)
+
+
+def child_exit(server, worker):
+    # Imported here: prometheus_client picks its multiprocess storage at import
+    # time, so it must not be loaded before PROMETHEUS_MULTIPROC_DIR is set.
+    from prometheus_client import multiprocess
+
+    # Fold the dead worker's live gauges out of the merged view.
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def when_ready(server):
+    # server.app.callable is only set here when the app was preloaded.
+    application = server.app.callable
+    if application is not None:
+        from app import warm_up
+
+        warm_up(application)
+
+
+def post_fork(server, worker):
+    application = server.app.callable
+    if application is not None:
+        import database
+        from models import db
+
+        database.dispose_after_fork(application, db)
@@ -0,0 +1,72 @@
+"""
+Paged, cached medical history of completed appointments.
+
+Pages run newest first on (date_scheduled, id), which the
+ix_appointment_patient_status_date index serves directly, with the doctor and
+treatment joined in the same query. Deep pages of a long-term patient cost
+the same as the first.
+
+Rendered pages are kept in `history_cache`. Each key includes a stamp of the
+patient's completed appointments (their count and highest id), read from the
+same index. When any worker completes or deletes one of the patient's
+appointments the stamp changes, and every worker stops using its old copy.
+AddTreatment also drops this worker's entries straight away, which frees
+the memory. Edits that leave the stamp alone, such as a doctor renaming
+themselves, show up once the TTL expires.
+"""
+
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+
+from caching import LRUCache
+from models import Appointment, db
+from pagination import keyset_page
+
+HISTORY_KEYS = [Appointment.date_scheduled, Appointment.id]
+
+history_cache = LRUCache(maxsize=256, ttl=300.0)
+
+
+def history_query(patient_id):
+    return Appointment.query.filter_by(
+        patient_id=patient_id, status="Completed"
+    ).options(joinedload(Appointment.doctor), joinedload(Appointment.treatment))
+
+
+def history_page(patient_id, after=None, limit=20):
+    """One newest-first page: (appointments, next_cursor)."""
+    return keyset_page(
+        history_query(patient_id),
+        HISTORY_KEYS,
+        after=after,
+        limit=limit,
+        descending=True,
+    )
+
+
+def history_stamp(patient_id):
+    count, last_id = (
+        db.session.query(func.count(Appointment.id), func.max(Appointment.id))
+        .filter(Appointment.patient_id == patient_id)
+        .filter(Appointment.status == "Completed")
+        .one()
+    )
+    return count, last_id
+
+
+def cached_history(patient_id, kind, after, limit, build):
+    """
+    `build(appointments, next_cursor)` for one page, cached per patient.
+
+    `kind` separates different renderings of the same page (HTML, JSON).
+    Cursors are validated by the page query, so a bad cursor raises
+    InvalidCursor on a miss and can never be cached.
+    """
+    key = (patient_id, kind, after, limit, history_stamp(patient_id))
+    return history_cache.get_or_set(
+        key, lambda: build(*history_page(patient_id, after, limit))
+    )
+
+
+def invalidate_patient_history(patient_id):
+    history_cache.invalidate_matching(lambda key: key[0] == patient_id)
@@ -0,0 +1,69 @@
+"""
+Conditional GET and payload caching for read-mostly JSON endpoints.
+
+Responses carry an ETag and Last-Modified derived from the data versions
+they depend on (see versioning.py). A client revalidating with If-None-Match
+or If-Modified-Since gets a 304 after one primary-key lookup. Otherwise the
+serialized body comes from an in-process cache keyed by the same versions,
+so it is rebuilt only after a write.
+"""
+
+from datetime import datetime, timezone
+
+from flask import current_app, request
+
+import versioning
+from caching import LRUCache
+
+payload_cache = LRUCache(maxsize=64, ttl=300.0)
+
+
+def _not_modified(etag, last_modified):
+    # If-None-Match wins over If-Modified-Since when both are sent (RFC 9110).
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return since is not None and last_modified <= since
+
+
+def validators(key, versions):
+    """Return (etag, last_modified, not_modified) for the current request."""
+    token, last_modified = versioning.current(*versions)
+    etag = f"{key}-{token}"
+    return etag, last_modified, _not_modified(etag, last_modified)
+
+
+def last_modified_header(last_modified):
+    """
+    Whether to send Last-Modified. A value still in the future (a write in
+    the current second) is left out: another write later in that second
+    would get the same date, so the client must revalidate with the ETag.
+    """
+    return last_modified <= datetime.now(timezone.utc)
+
+
+def with_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified_header(last_modified):
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+
+def conditional_json(key, versions, build):
+    """
+    Serve `build()` as JSON under cache `key`, validated by `versions`.
+
+    `build` must be deterministic for a given set of versions; it is only
+    called on a cache miss.
+    """
+    etag, last_modified, not_modified = validators(key, versions)
+
+    if not_modified:
+        response = current_app.response_class(status=304)
+    else:
+        body = payload_cache.get_or_set(
+            (etag, key), lambda: current_app.json.dumps(build()).encode()
+        )
+        response = current_app.response_class(body, mimetype="application/json")
+    return with_validators(response, etag, last_modified)
@@ -0,0 +1,52 @@
+"""
+Loading the logged-in user for each request.
+
+The user is fetched together with their admin, doctor or patient profile in
+one query (the profiles are one-to-one, so the joins add no rows), which
+covers every `current_user.<role>_profile` access a route or template makes.
+
+The loaded user is also kept for a short time in `identity_cache`, detached
+from any session. On a hit, `merge(load=False)` attaches a copy to the
+request's session without touching the database, so an authenticated request
+starts with no queries at all. The copy behaves like any loaded instance:
+routes can change and commit it, and attributes that were not loaded lazy-load
+as usual.
+
+The routes that edit or delete users and profiles call `invalidate_user`,
+which drops this worker's entry straight away. Other workers pick the change
+up when the TTL expires, so keep it short.
+"""
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload
+
+from caching import LRUCache
+from models import User, db
+
+identity_cache = LRUCache(maxsize=1024, ttl=30.0)
+
+PROFILES = (User.admin_profile, User.doctor_profile, User.patient_profile)
+
+
+def _fetch(user_id):
+    # A private session, so the cached instance is never expired by a commit
+    # in the request that happened to load it.
+    with Session(db.engine) as session:
+        query = select(User).where(User.id == user_id)
+        query = query.options(*(joinedload(profile) for profile in PROFILES))
+        return session.scalars(query).unique().one_or_none()
+
+
+def load_user(user_id):
+    """The user with their profile, attached to the request session, or None."""
+    user = identity_cache.get(user_id)
+    if user is None:
+        user = _fetch(user_id)
+        if user is None:
+            return None
+        identity_cache.set(user_id, user)
+    return db.session.merge(user, load=False)
+
+
+def invalidate_user(user_id):
+    identity_cache.invalidate(user_id)
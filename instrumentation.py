@@ -0,0 +1,174 @@
+"""
+Per-request SQL, template and latency instrumentation.
+
+Listeners on every SQLAlchemy engine count the statements issued while a
+request is being handled and time them; Flask's template signals time
+rendering. After each request the totals are recorded per endpoint in
+Prometheus histograms served at /metrics.
+
+Under gunicorn each worker is a separate process, so metrics use the
+prometheus_client multiprocess mode whenever PROMETHEUS_MULTIPROC_DIR is set
+(see gunicorn.conf.py): every worker writes its samples to that directory and
+/metrics merges them, whichever worker answers the scrape.
+
+When `SQL_STATEMENT_BUDGET` (or a per-endpoint entry in
+`SQL_STATEMENT_BUDGETS`) is configured, a request that issues more statements
+than its budget raises SQLBudgetExceeded under TESTING, which the test client
+propagates, so a reintroduced N+1 query fails CI loudly instead of slowly.
+Outside of testing the overrun is only logged.
+"""
+
+import os
+import time
+
+from flask import (
+    Response,
+    before_render_template,
+    g,
+    has_request_context,
+    request,
+    template_rendered,
+)
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, float("inf"))
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request, by endpoint.",
+    ["endpoint", "method", "status"],
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements",
+    "SQL statements issued per request, by endpoint.",
+    ["endpoint"],
+    buckets=STATEMENT_BUCKETS,
+)
+REQUEST_SQL_SECONDS = Histogram(
+    "http_request_sql_duration_seconds",
+    "Time spent executing SQL per request, by endpoint.",
+    ["endpoint"],
+)
+REQUEST_TEMPLATE_SECONDS = Histogram(
+    "http_request_template_duration_seconds",
+    "Time spent rendering templates per request, by endpoint.",
+    ["endpoint"],
+)
+
+
+class SQLBudgetExceeded(RuntimeError):
+    pass
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.sql_statements = g.get("sql_statements", 0) + 1
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if has_request_context() and started:
+        g.sql_seconds = g.get("sql_seconds", 0.0) + time.perf_counter() - started.pop()
+
+
+@event.listens_for(Engine, "handle_error")
+def _failed_statement(context):
+    # after_cursor_execute never fires for a failed statement.
+    started = (
+        context.connection.info.get("query_started") if context.connection else None
+    )
+    if started:
+        started.pop()
+
+
+def _start_render(sender, template, context, **extra):
+    g.setdefault("render_started", []).append(time.perf_counter())
+
+
+def _end_render(sender, template, context, **extra):
+    started = g.get("render_started")
+    if started:
+        elapsed = time.perf_counter() - started.pop()
+        g.template_seconds = g.get("template_seconds", 0.0) + elapsed
+
+
+def statement_count():
+    return g.get("sql_statements", 0)
+
+
+def budget_for(app, endpoint):
+    per_endpoint = app.config.get("SQL_STATEMENT_BUDGETS") or {}
+    return per_endpoint.get(endpoint, app.config.get("SQL_STATEMENT_BUDGET"))
+
+
+def metrics_payload():
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def init_app(app):
+    app.config.setdefault("SQL_STATEMENT_BUDGET", None)
+    app.config.setdefault("SQL_STATEMENT_BUDGETS", {})
+
+    before_render_template.connect(_start_render, app)
+    template_rendered.connect(_end_render, app)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.get("request_started")
+        if started is None or request.endpoint == "metrics":
+            return response
+
+        # Unmatched URLs share one label so 404 scans cannot blow up cardinality.
+        endpoint = request.endpoint or "unmatched"
+        REQUEST_LATENCY.labels(endpoint, request.method, response.status_code).observe(
+            time.perf_counter() - started
+        )
+        REQUEST_SQL_STATEMENTS.labels(endpoint).observe(statement_count())
+        REQUEST_SQL_SECONDS.labels(endpoint).observe(g.get("sql_seconds", 0.0))
+        REQUEST_TEMPLATE_SECONDS.labels(endpoint).observe(
+            g.get("template_seconds", 0.0)
+        )
+        g.request_started = None
+        return response
+
+    @app.after_request
+    def enforce_sql_budget(response):
+        budget = budget_for(app, request.endpoint)
+        used = statement_count()
+        # The error response for an overrun passes through here again.
+        if budget is None or used <= budget or g.get("sql_budget_reported"):
+            return response
+
+        g.sql_budget_reported = True
+        message = (
+            f"{request.method} {request.path} ({request.endpoint}) issued "
+            f"{used} SQL statements, budget is {budget}"
+        )
+        if app.testing:
+            raise SQLBudgetExceeded(message)
+        app.logger.warning(message)
+        return response
+
+    @app.route("/metrics", methods=["GET"], endpoint="metrics")
+    def Metrics():
+        return Response(metrics_payload(), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,215 @@
+"""
+Database-backed job queue.
+
+Request handlers only call `enqueue`, which adds a Job row to the current
+session. The job commits or rolls back together with the booking or
+cancellation that caused it, and the request never waits on a side effect.
+`flask worker` runs `work`, which repeatedly:
+
+1. Releases jobs whose worker died mid-run (locked longer than LOCK_TIMEOUT).
+2. Claims up to `batch_size` due jobs with one conditional UPDATE. A job can
+   therefore only be claimed by one worker, however many are running.
+3. Runs each job's handler. Handlers return the messages to send, and the
+   messages from the whole batch go to the sender in one `send_batch` call.
+4. Marks jobs done. A failed job is retried with exponential backoff until it
+   has used `max_attempts`, and is then left as failed with its last error.
+
+Jobs with a future `run_at` (such as reminders) wait until they are due.
+All times are naive UTC, like the rest of the schema.
+"""
+
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+
+from models import Job, db
+
+log = logging.getLogger(__name__)
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+RETRY_BASE_SECONDS = 30
+LOCK_TIMEOUT = timedelta(minutes=10)
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """Register `fn(payload) -> [messages]` as the handler for `kind` jobs."""
+
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+
+    return register
+
+
+def enqueue(kind, payload=None, run_at=None, max_attempts=5):
+    """Add a job to the session; it is committed with the caller's transaction."""
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        run_at=run_at or datetime.utcnow(),
+        max_attempts=max_attempts,
+    )
+    db.session.add(job)
+    return job
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def release_stale(now=None):
+    """Put jobs abandoned by a crashed worker back in the queue."""
+    now = now or datetime.utcnow()
+    result = db.session.execute(
+        update(Job)
+        .where(Job.status == RUNNING, Job.locked_at < now - LOCK_TIMEOUT)
+        .values(status=PENDING, locked_by=None, locked_at=None),
+        execution_options={"synchronize_session": False},
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def claim(worker, batch_size, now=None):
+    """Lock up to `batch_size` due jobs for `worker` and return them."""
+    now = now or datetime.utcnow()
+    due = (
+        select(Job.id)
+        .where(Job.status == PENDING, Job.run_at <= now)
+        .order_by(Job.run_at, Job.id)
+        .limit(batch_size)
+    )
+    # Re-checking the status in the UPDATE itself means a row claimed by a
+    # concurrent worker in the meantime is skipped, not claimed twice.
+    db.session.execute(
+        update(Job)
+        .where(Job.id.in_(due.scalar_subquery()), Job.status == PENDING)
+        .values(
+            status=RUNNING,
+            locked_by=worker,
+            locked_at=now,
+            attempts=Job.attempts + 1,
+        ),
+        execution_options={"synchronize_session": False},
+    )
+    db.session.commit()
+    return (
+        Job.query.filter_by(status=RUNNING, locked_by=worker)
+        .order_by(Job.run_at, Job.id)
+        .all()
+    )
+
+
+def _finish(job, now):
+    job.status = DONE
+    job.finished_at = now
+    job.locked_by = job.locked_at = None
+
+
+def _fail(job, error, now):
+    job.last_error = f"{type(error).__name__}: {error}"
+    job.locked_by = job.locked_at = None
+    if job.attempts >= job.max_attempts:
+        job.status = FAILED
+        job.finished_at = now
+        log.error("Job %s (%s) failed for good: %s", job.id, job.kind, error)
+    else:
+        job.status = PENDING
+        job.run_at = now + retry_delay(job.attempts)
+        log.warning(
+            "Job %s (%s) failed, retrying at %s: %s",
+            job.id,
+            job.kind,
+            job.run_at,
+            error,
+        )
+
+
+def run_batch(jobs, sender):
+    """Run the handlers for `jobs` and send their messages in one batch."""
+    outbox = []
+    for job in jobs:
+        # A savepoint per job: a failing handler only rolls back its own
+        # work, not the bookkeeping already done for the rest of the batch.
+        savepoint = db.session.begin_nested()
+        try:
+            fn = HANDLERS.get(job.kind)
+            if fn is None:
+                raise LookupError(f"no handler for job kind {job.kind!r}")
+            messages = list(fn(json.loads(job.payload)) or [])
+            savepoint.commit()
+            outbox.append((job, messages))
+        except Exception as exc:
+            savepoint.rollback()
+            _fail(job, exc, datetime.utcnow())
+
+    messages = [message for _, batch in outbox for message in batch]
+    try:
+        if messages:
+            sender.send_batch(messages)
+    except Exception as exc:
+        now = datetime.utcnow()
+        for job, batch in outbox:
+            if batch:
+                _fail(job, exc, now)
+            else:
+                _finish(job, now)
+    else:
+        now = datetime.utcnow()
+        for job, _ in outbox:
+            _finish(job, now)
+    db.session.commit()
+    return len(messages)
+
+
+def work(sender, batch_size=50, poll_interval=2.0, once=False, should_stop=None):
+    """
+    Process jobs until `should_stop()` is true, or until the queue has no due
+    jobs when `once` is set. Returns the number of jobs processed.
+    """
+    worker = worker_name()
+    should_stop = should_stop or (lambda: False)
+    processed = 0
+    release_stale()
+    while not should_stop():
+        jobs = claim(worker, batch_size)
+        if jobs:
+            sent = run_batch(jobs, sender)
+            processed += len(jobs)
+            log.info("Ran %d jobs, sent %d messages", len(jobs), sent)
+            continue
+        if once:
+            break
+        time.sleep(poll_interval)
+        release_stale()
+    return processed
+
+
+def queue_stats():
+    """Job counts by status, plus how many pending jobs are already due."""
+    counts = dict(
+        db.session.query(Job.status, func.count(Job.id)).group_by(Job.status).all()
+    )
+    due = (
+        db.session.query(func.count(Job.id))
+        .filter(Job.status == PENDING, Job.run_at <= datetime.utcnow())
+        .scalar()
+    )
+    return {
+        **{
+            status: counts.get(status, 0) for status in (PENDING, RUNNING, DONE, FAILED)
+        },
+        "due": due,
+    }
@@ -0,0 +1,321 @@
+"""
+Lightweight, forward-only schema migrations.
+
+`db.create_all()` only creates missing tables, so changes to existing tables
+(new indexes, constraints, triggers) are applied here instead. Each migration
+runs once, in its own transaction, and is recorded in `schema_migrations`.
+Migrations must be idempotent so they are safe on databases that were created
+by a newer `db.create_all()`. A migration that cannot be applied to the data
+as it stands raises MigrationError; its transaction is rolled back and the
+later migrations stay pending until the data is fixed.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import text
+
+Migration = namedtuple("Migration", ["version", "description", "apply"])
+
+MIGRATIONS = []
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append(Migration(version, description, fn))
+        return fn
+
+    return register
+
+
+@migration(1, "Indexes for hot query paths")
+def add_hot_path_indexes(conn):
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_admin_user_id ON admin (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_doctor_user_id ON doctor (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_doctor_department_id "
+        "ON doctor (department_id)",
+        "CREATE INDEX IF NOT EXISTS ix_patient_user_id ON patient (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_doctor_availability_doctor_day "
+        "ON doctor_availability (doctor_id, day_of_week)",
+        "CREATE INDEX IF NOT EXISTS ix_appointment_doctor_slot "
+        "ON appointment (doctor_id, date_scheduled, time_scheduled)",
+        "CREATE INDEX IF NOT EXISTS ix_appointment_patient_status_date "
+        "ON appointment (patient_id, status, date_scheduled)",
+        "CREATE INDEX IF NOT EXISTS ix_appointment_date_id "
+        "ON appointment (date_scheduled, id)",
+        "CREATE INDEX IF NOT EXISTS ix_treatment_appointment_id "
+        "ON treatment (appointment_id)",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def _create_slot_index(conn):
+    from models import holds_slot_sql
+
+    # Slots double-booked before the constraint existed are left for an
+    # operator to resolve: which booking stays is a decision for the clinic,
+    # and the patients whose visit moves need to hear about it.
+    conflicts = conn.execute(
+        text(
+            "SELECT a.id, b.id AS other_id, a.doctor_id, a.date_scheduled, "
+            "a.time_scheduled "
+            f"FROM appointment a JOIN appointment b ON {holds_slot_sql('b.status')} "
+            "AND b.doctor_id = a.doctor_id "
+            "AND b.date_scheduled = a.date_scheduled "
+            "AND b.time_scheduled = a.time_scheduled AND b.id < a.id "
+            f"WHERE {holds_slot_sql('a.status')} ORDER BY b.id, a.id"
+        )
+    ).fetchall()
+    if conflicts:
+        raise MigrationError(
+            "Double-booked doctor slots, resolve these appointments first:\n"
+            + "\n".join(
+                f"  appointments {row.other_id} and {row.id}: doctor "
+                f"{row.doctor_id} on {row.date_scheduled} at {row.time_scheduled}"
+                for row in conflicts
+            )
+        )
+
+    conn.execute(
+        text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_appointment_scheduled_slot "
+            "ON appointment (doctor_id, date_scheduled, time_scheduled) "
+            f"WHERE {holds_slot_sql()}"
+        )
+    )
+
+
+@migration(2, "Unique scheduled appointment per doctor slot")
+def add_scheduled_slot_constraint(conn):
+    _create_slot_index(conn)
+
+
+@migration(3, "Seed data version counters")
+def seed_data_versions(conn):
+    conn.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS data_version ("
+            "name VARCHAR(50) NOT NULL PRIMARY KEY, "
+            "version INTEGER NOT NULL, "
+            "updated_at DATETIME NOT NULL)"
+        )
+    )
+    # Rows exist up front so concurrent first bumps never race on the insert.
+    for name in ("departments", "doctors"):
+        exists = conn.execute(
+            text("SELECT 1 FROM data_version WHERE name = :name"), {"name": name}
+        ).first()
+        if not exists:
+            conn.execute(
+                text(
+                    "INSERT INTO data_version (name, version, updated_at) "
+                    "VALUES (:name, 1, :now)"
+                ),
+                {"name": name, "now": datetime.utcnow()},
+            )
+
+
+SEARCH_INDEXES = {
+    "patient_search": {
+        "table": "patient",
+        "columns": ("full_name", "phone", "address"),
+    },
+    "doctor_search": {
+        "table": "doctor",
+        "columns": ("full_name", "qualification"),
+    },
+}
+
+
+@migration(4, "Full-text search indexes for patients and doctors")
+def add_search_indexes(conn):
+    # FTS5 is SQLite-only; search.py falls back to LIKE filters elsewhere.
+    if conn.dialect.name != "sqlite":
+        return
+
+    for index, spec in SEARCH_INDEXES.items():
+        table, columns = spec["table"], spec["columns"]
+        indexed = ", ".join(columns + ("username",))
+        new_values = ", ".join(f"NEW.{column}" for column in columns)
+        username = 'SELECT username FROM "user" WHERE id = NEW.user_id'
+        insert_new = (
+            f"INSERT INTO {index} (rowid, {indexed}) "
+            f"VALUES (NEW.id, {new_values}, ({username}));"
+        )
+
+        conn.execute(
+            text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5("
+                f"{indexed}, tokenize='unicode61', prefix='2 3')"
+            )
+        )
+        conn.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {index}_insert "
+                f"AFTER INSERT ON {table} BEGIN {insert_new} END"
+            )
+        )
+        conn.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {index}_update "
+                f"AFTER UPDATE OF {', '.join(columns)}, user_id ON {table} BEGIN "
+                f"DELETE FROM {index} WHERE rowid = OLD.id; {insert_new} END"
+            )
+        )
+        conn.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {index}_delete "
+                f"AFTER DELETE ON {table} BEGIN "
+                f"DELETE FROM {index} WHERE rowid = OLD.id; END"
+            )
+        )
+        conn.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS {index}_username "
+                'AFTER UPDATE OF username ON "user" BEGIN '
+                f"UPDATE {index} SET username = NEW.username WHERE rowid IN "
+                f"(SELECT id FROM {table} WHERE user_id = NEW.id); END"
+            )
+        )
+
+        # Backfill rows that existed before the triggers.
+        conn.execute(text(f"DELETE FROM {index}"))
+        conn.execute(
+            text(
+                f"INSERT INTO {index} (rowid, {indexed}) "
+                f"SELECT t.id, {', '.join(f't.{c}' for c in columns)}, u.username "
+                f'FROM {table} t JOIN "user" u ON u.id = t.user_id'
+            )
+        )
+
+
+TREATMENT_SEARCH_COLUMNS = ("diagnosis", "prescription", "notes", "tests_done")
+
+
+@migration(5, "Full-text search index for treatment records")
+def add_treatment_search_index(conn):
+    if conn.dialect.name != "sqlite":
+        return
+
+    columns = ", ".join(TREATMENT_SEARCH_COLUMNS)
+    new_values = ", ".join(f"NEW.{c}" for c in TREATMENT_SEARCH_COLUMNS)
+    old_values = ", ".join(f"OLD.{c}" for c in TREATMENT_SEARCH_COLUMNS)
+    # External content: the index reads text back from treatment, and removing
+    # a row means handing FTS5 the old values through the 'delete' command.
+    insert_new = (
+        f"INSERT INTO treatment_search (rowid, {columns}) "
+        f"VALUES (NEW.id, {new_values});"
+    )
+    delete_old = (
+        f"INSERT INTO treatment_search (treatment_search, rowid, {columns}) "
+        f"VALUES ('delete', OLD.id, {old_values});"
+    )
+
+    conn.execute(
+        text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS treatment_search USING fts5("
+            f"{columns}, content='treatment', content_rowid='id', "
+            "tokenize='unicode61', prefix='2 3')"
+        )
+    )
+    conn.execute(
+        text(
+            "CREATE TRIGGER IF NOT EXISTS treatment_search_insert "
+            f"AFTER INSERT ON treatment BEGIN {insert_new} END"
+        )
+    )
+    conn.execute(
+        text(
+            "CREATE TRIGGER IF NOT EXISTS treatment_search_update "
+            f"AFTER UPDATE OF {columns} ON treatment BEGIN "
+            f"{delete_old} {insert_new} END"
+        )
+    )
+    conn.execute(
+        text(
+            "CREATE TRIGGER IF NOT EXISTS treatment_search_delete "
+            f"AFTER DELETE ON treatment BEGIN {delete_old} END"
+        )
+    )
+    conn.execute(
+        text("INSERT INTO treatment_search (treatment_search) VALUES ('rebuild')")
+    )
+
+
+@migration(6, "Backfill the daily appointment statistics rollup")
+def backfill_daily_stats(conn):
+    import rollup
+
+    # Fresh databases get the table from create_all; older ones from here.
+    rollup.STAT.create(conn, checkfirst=True)
+    for index in rollup.STAT.indexes:
+        index.create(conn, checkfirst=True)
+    rollup.rebuild(conn)
+
+
+@migration(7, "Background job queue")
+def add_job_queue(conn):
+    from models import Job
+
+    Job.__table__.create(conn, checkfirst=True)
+    for index in Job.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+@migration(8, "Completed appointments keep holding their doctor slot")
+def rebuild_slot_index(conn):
+    # Databases migrated earlier have the index over 'Scheduled' rows only.
+    conn.execute(text("DROP INDEX IF EXISTS ux_appointment_scheduled_slot"))
+    _create_slot_index(conn)
+
+
+def _ensure_version_table(conn):
+    conn.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, "
+            "description VARCHAR(200) NOT NULL, "
+            "applied_at TIMESTAMP NOT NULL)"
+        )
+    )
+
+
+def applied_versions(engine):
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        rows = conn.execute(text("SELECT version FROM schema_migrations"))
+        return {row[0] for row in rows}
+
+
+def pending_migrations(engine):
+    done = applied_versions(engine)
+    return [m for m in sorted(MIGRATIONS) if m.version not in done]
+
+
+def upgrade(engine, echo=print):
+    """Apply every pending migration in version order. Returns how many ran."""
+    pending = pending_migrations(engine)
+    for step in pending:
+        echo(f"Applying migration {step.version}: {step.description}")
+        with engine.begin() as conn:
+            step.apply(conn)
+            conn.execute(
+                text(
+                    "INSERT INTO schema_migrations (version, description, applied_at) "
+                    "VALUES (:version, :description, :applied_at)"
+                ),
+                {
+                    "version": step.version,
+                    "description": step.description,
+                    "applied_at": datetime.utcnow(),
+                },
+            )
+    if not pending:
+        echo("Database schema is up to date.")
+    return len(pending)
@@ -17,6 +17,8 @@ class User(UserMixin, db.Model):
 
 
 class Admin(db.Model):
+    __table_args__ = (db.Index("ix_admin_user_id", "user_id"),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     full_name = db.Column(db.String(150), nullable=False)
@@ -31,6 +33,11 @@ class Department(db.Model):
 
 
 class Doctor(db.Model):
+    __table_args__ = (
+        db.Index("ix_doctor_user_id", "user_id"),
+        db.Index("ix_doctor_department_id", "department_id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     department_id = db.Column(db.Integer, db.ForeignKey("department.id"), nullable=True)
@@ -44,9 +51,17 @@ class Doctor(db.Model):
     appointments = db.relationship(
         "Appointment", backref="doctor", lazy=True, cascade="all, delete-orphan"
     )
+    availability_exceptions = db.relationship(
+        "AvailabilityException",
+        backref="doctor",
+        lazy=True,
+        cascade="all, delete-orphan",
+    )
 
 
 class Patient(db.Model):
+    __table_args__ = (db.Index("ix_patient_user_id", "user_id"),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
 
@@ -61,6 +76,10 @@ class Patient(db.Model):
 
 
 class DoctorAvailability(db.Model):
+    __table_args__ = (
+        db.Index("ix_doctor_availability_doctor_day", "doctor_id", "day_of_week"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     doctor_id = db.Column(db.Integer, db.ForeignKey("doctor.id"), nullable=False)
 
@@ -70,7 +89,71 @@ class DoctorAvailability(db.Model):
     is_available = db.Column(db.Boolean, default=True)
 
 
+class AvailabilityException(db.Model):
+    """
+    Date-specific hours that replace the weekly template for that day.
+    A row without times marks the doctor as off for the whole day.
+    """
+
+    __tablename__ = "availability_exception"
+    __table_args__ = (
+        db.Index("ix_availability_exception_doctor_date", "doctor_id", "date"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey("doctor.id"), nullable=False)
+
+    date = db.Column(db.Date, nullable=False)
+    start_time = db.Column(db.Time, nullable=True)
+    end_time = db.Column(db.Time, nullable=True)
+
+
+# Appointment statuses that hold their doctor slot: everything but
+# "Cancelled". The slot picker (availability.booked_times), the
+# ux_appointment_scheduled_slot index and its migrations all derive from
+# this, so a slot is shown as taken exactly when another booking of it would
+# violate the index.
+HOLDING_STATUSES = ("Scheduled", "Completed")
+
+
+def holds_slot_sql(column="status"):
+    """SQL predicate for HOLDING_STATUSES on `column`, for raw DDL and queries."""
+    quoted = ", ".join(f"'{status}'" for status in HOLDING_STATUSES)
+    if len(HOLDING_STATUSES) == 1:
+        return f"{column} = {quoted}"
+    return f"{column} IN ({quoted})"
+
+
 class Appointment(db.Model):
+    __table_args__ = (
+        # Slot lookups and a doctor's own list: (doctor_id, date[, time]).
+        db.Index(
+            "ix_appointment_doctor_slot",
+            "doctor_id",
+            "date_scheduled",
+            "time_scheduled",
+        ),
+        # Patient dashboard and medical history, newest first.
+        db.Index(
+            "ix_appointment_patient_status_date",
+            "patient_id",
+            "status",
+            "date_scheduled",
+        ),
+        # Admin keyset pagination on (date_scheduled, id).
+        db.Index("ix_appointment_date_id", "date_scheduled", "id"),
+        # At most one slot-holding appointment per doctor slot.
+        db.Index(
+            "ux_appointment_scheduled_slot",
+            "doctor_id",
+            "date_scheduled",
+            "time_scheduled",
+            unique=True,
+            sqlite_where=db.text(holds_slot_sql()),
+            postgresql_where=db.text(holds_slot_sql()),
+        ),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey("patient.id"), nullable=False)
     doctor_id = db.Column(db.Integer, db.ForeignKey("doctor.id"), nullable=False)
@@ -85,6 +168,8 @@ class Appointment(db.Model):
 
 
 class Treatment(db.Model):
+    __table_args__ = (db.Index("ix_treatment_appointment_id", "appointment_id"),)
+
     id = db.Column(db.Integer, primary_key=True)
     appointment_id = db.Column(
         db.Integer, db.ForeignKey("appointment.id"), nullable=False
@@ -97,3 +182,48 @@ class Treatment(db.Model):
 
     visit_type = db.Column(db.String(50), nullable=True)
     tests_done = db.Column(db.Text, nullable=True)
+
+
+class DataVersion(db.Model):
+    """Change counter per cached data set, shared by every worker."""
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class AppointmentDailyStat(db.Model):
+    """Appointment counts per day, doctor and status, kept current by rollup.py."""
+
+    __tablename__ = "appointment_daily_stat"
+    __table_args__ = (
+        db.Index("ix_appointment_daily_stat_department_day", "department_id", "day"),
+    )
+
+    day = db.Column(db.Date, primary_key=True)
+    doctor_id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    # Follows the doctor's current department; see rollup.py.
+    department_id = db.Column(db.Integer, nullable=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Job(db.Model):
+    """Background work queued by request handlers and run by `flask worker`."""
+
+    __table_args__ = (db.Index("ix_job_status_run_at", "status", "run_at"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default="{}")
+
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    last_error = db.Column(db.Text, nullable=True)
+
+    locked_by = db.Column(db.String(64), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
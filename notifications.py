@@ -0,0 +1,206 @@
+"""
+Appointment notifications, delivered by the background worker.
+
+The routes call `booked`, `rescheduled` and `cancelled`, which only enqueue
+jobs (see jobs.py). The job handlers below run in `flask worker`. They load
+the appointment fresh, build Messages and hand them to the configured sender.
+
+A reminder is scheduled REMINDER_LEAD before the visit. It carries the slot
+it was created for, so a reminder for a visit that was since cancelled or
+moved sends nothing; the reschedule queues a new one.
+
+Senders are pluggable through NOTIFICATION_SENDER:
+
+    log                   log each message (the default)
+    file:/path/out.jsonl  append each message as a JSON line, handy in tests
+    package.module:Class  any class with send_batch(messages)
+"""
+
+import importlib
+import json
+import logging
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+
+import jobs
+from models import Appointment, db
+
+log = logging.getLogger(__name__)
+
+REMINDER_LEAD = timedelta(hours=24)
+
+
+@dataclass(frozen=True)
+class Message:
+    user_id: int
+    recipient: str
+    phone: str
+    subject: str
+    body: str
+
+
+class LogSender:
+    def send_batch(self, messages):
+        for message in messages:
+            log.info("Notify %s: %s", message.recipient, message.subject)
+
+
+class FileSender:
+    def __init__(self, path):
+        self.path = path
+
+    def send_batch(self, messages):
+        with open(self.path, "a", encoding="utf-8") as out:
+            for message in messages:
+                out.write(json.dumps(asdict(message)) + "\n")
+
+
+def load_sender(spec):
+    spec = spec or "log"
+    if spec == "log":
+        return LogSender()
+    kind, _, path = spec.partition(":")
+    if kind == "file" and path:
+        return FileSender(path)
+    module_name, _, class_name = spec.partition(":")
+    if not class_name:
+        raise ValueError(f"Unknown NOTIFICATION_SENDER {spec!r}")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def _slot(appt):
+    return datetime.combine(appt.date_scheduled, appt.time_scheduled)
+
+
+def _utc(local):
+    """Naive local time -> naive UTC, the convention for Job.run_at."""
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# Enqueue helpers, called by the routes before they commit.
+
+
+def booked(appt):
+    payload = {"appointment_id": appt.id}
+    jobs.enqueue("appointment.booked", payload)
+    _schedule_reminder(appt)
+
+
+def rescheduled(appt):
+    jobs.enqueue("appointment.rescheduled", {"appointment_id": appt.id})
+    _schedule_reminder(appt)
+
+
+def cancelled(appt, by):
+    jobs.enqueue("appointment.cancelled", {"appointment_id": appt.id, "by": by})
+
+
+def _schedule_reminder(appt):
+    slot = _slot(appt)
+    remind_at = _utc(slot - REMINDER_LEAD)
+    if remind_at > datetime.utcnow():
+        payload = {"appointment_id": appt.id, "slot": slot.isoformat()}
+        jobs.enqueue("appointment.reminder", payload, run_at=remind_at)
+
+
+# Job handlers, run by the worker.
+
+
+def _when(appt):
+    return f"{appt.date_scheduled:%A %d %B %Y} at {appt.time_scheduled:%H:%M}"
+
+
+def _to_patient(appt, subject, body):
+    patient = appt.patient
+    return Message(
+        user_id=patient.user_id,
+        recipient=patient.full_name,
+        phone=patient.phone,
+        subject=subject,
+        body=body,
+    )
+
+
+def _to_doctor(appt, subject, body):
+    doctor = appt.doctor
+    return Message(
+        user_id=doctor.user_id,
+        recipient=f"Dr. {doctor.full_name}",
+        phone=None,
+        subject=subject,
+        body=body,
+    )
+
+
+def _load(payload):
+    return db.session.get(Appointment, payload["appointment_id"])
+
+
+@jobs.handler("appointment.booked")
+def send_confirmation(payload):
+    appt = _load(payload)
+    if appt is None or appt.status != "Scheduled":
+        return []
+    return [
+        _to_patient(
+            appt,
+            "Appointment confirmed",
+            f"Your appointment with Dr. {appt.doctor.full_name} is confirmed "
+            f"for {_when(appt)}.",
+        )
+    ]
+
+
+@jobs.handler("appointment.rescheduled")
+def send_reschedule_notice(payload):
+    appt = _load(payload)
+    if appt is None or appt.status != "Scheduled":
+        return []
+    body = f"Your appointment with Dr. {appt.doctor.full_name} is now {_when(appt)}."
+    return [
+        _to_patient(appt, "Appointment rescheduled", body),
+        _to_doctor(
+            appt,
+            "Appointment rescheduled",
+            f"{appt.patient.full_name} moved their appointment to {_when(appt)}.",
+        ),
+    ]
+
+
+@jobs.handler("appointment.cancelled")
+def send_cancellation_notice(payload):
+    appt = _load(payload)
+    if appt is None:
+        return []
+    if payload.get("by") == "doctor":
+        return [
+            _to_patient(
+                appt,
+                "Appointment cancelled",
+                f"Dr. {appt.doctor.full_name} had to cancel your appointment on "
+                f"{_when(appt)}. Please book another slot.",
+            )
+        ]
+    return [
+        _to_doctor(
+            appt,
+            "Appointment cancelled",
+            f"{appt.patient.full_name} cancelled their appointment on {_when(appt)}.",
+        )
+    ]
+
+
+@jobs.handler("appointment.reminder")
+def send_reminder(payload):
+    appt = _load(payload)
+    if appt is None or appt.status != "Scheduled":
+        return []
+    if _slot(appt).isoformat() != payload["slot"]:
+        return []
+    return [
+        _to_patient(
+            appt,
+            "Appointment reminder",
+            f"Reminder: you see Dr. {appt.doctor.full_name} on {_when(appt)}.",
+        )
+    ]
@@ -0,0 +1,100 @@
+import base64
+import json
+from datetime import date, datetime, time
+
+from sqlalchemy import tuple_
+from sqlalchemy.engine import Row
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    """Pack the sort-key values of the last row on a page into a URL-safe token."""
+    plain = [v.isoformat() if isinstance(v, (date, time)) else v for v in values]
+    raw = json.dumps(plain, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token, keys):
+    """Inverse of encode_cursor, converting values back using the key column types."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor("Malformed cursor") from exc
+
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise InvalidCursor("Cursor does not match this listing")
+
+    decoded = []
+    for key, value in zip(keys, values):
+        python_type = key.type.python_type
+        try:
+            if python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif python_type is date:
+                value = date.fromisoformat(value)
+            elif python_type is time:
+                value = time.fromisoformat(value)
+            else:
+                value = python_type(value)
+        except (ValueError, TypeError) as exc:
+            raise InvalidCursor("Malformed cursor") from exc
+        decoded.append(value)
+    return tuple(decoded)
+
+
+def clamp_page_size(raw, default=DEFAULT_PAGE_SIZE):
+    try:
+        size = int(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def _key_values(row, keys):
+    # Rows are entities, (entity, extra...) tuples or plain column rows.
+    if isinstance(row, Row) and hasattr(row[0], "__table__"):
+        row = row[0]
+    return [getattr(row, k.key) for k in keys]
+
+
+def keyset_page(query, keys, after=None, limit=DEFAULT_PAGE_SIZE, descending=False):
+    """
+    Return one page of `query` ordered by `keys`, starting after the cursor `after`.
+
+    Instead of OFFSET, the previous page's last key is turned into a row-value
+    comparison, so every page is an index range scan of `limit` rows no matter
+    how deep the client has paged. Returns (rows, next_cursor); next_cursor is
+    None on the last page. `keys` must end with a unique column (usually the id).
+    """
+    rows = keyset_bounds(query, keys, after, limit, descending).all()
+    return split_page(rows, keys, limit)
+
+
+def keyset_bounds(query, keys, after=None, limit=DEFAULT_PAGE_SIZE, descending=False):
+    """
+    The page query behind keyset_page, without running it. Works on a Query or
+    a select(); it fetches one row more than `limit` to detect the last page.
+    """
+    if after:
+        bound = decode_cursor(after, keys)
+        key_tuple = tuple_(*keys)
+        query = query.filter(key_tuple < bound if descending else key_tuple > bound)
+
+    ordering = [k.desc() if descending else k.asc() for k in keys]
+    return query.order_by(*ordering).limit(limit + 1)
+
+
+def split_page(rows, keys, limit):
+    """(rows, next_cursor) from the rows fetched by a keyset_bounds query."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(_key_values(rows[-1], keys))
+    return rows, next_cursor
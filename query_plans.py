@@ -0,0 +1,103 @@
+"""
+EXPLAIN-based guard for the queries that run on every dashboard and booking.
+
+Each entry builds the same statement shape the routes issue. `check_plans`
+runs `EXPLAIN QUERY PLAN` for each one and reports any that read a table with
+a full scan instead of an index search, so a dropped or mis-ordered index is
+caught before it reaches production.
+"""
+
+import re
+from datetime import date, datetime, time
+
+from sqlalchemy import func, select, tuple_
+
+from models import (
+    Appointment,
+    AppointmentDailyStat,
+    AvailabilityException,
+    Department,
+    Doctor,
+    DoctorAvailability,
+    Job,
+    Patient,
+    Treatment,
+)
+
+STAT = AppointmentDailyStat.__table__
+
+# "SCAN appointment" is a full table scan; "SCAN appointment USING INDEX ..."
+# walks an index in order (fine under a LIMIT) and "SEARCH" is a range lookup.
+FULL_SCAN = re.compile(r"\bSCAN (\w+)\b(?! USING)")
+
+HOT_QUERIES = {
+    "doctor dashboard appointments": lambda: select(Appointment)
+    .where(Appointment.doctor_id == 1)
+    .order_by(Appointment.date_scheduled),
+    "patient history page": lambda: select(Appointment)
+    .where(
+        Appointment.patient_id == 1,
+        Appointment.status == "Completed",
+        tuple_(Appointment.date_scheduled, Appointment.id) < (date(2025, 1, 1), 100),
+    )
+    .order_by(Appointment.date_scheduled.desc(), Appointment.id.desc())
+    .limit(21),
+    "patient dashboard appointments": lambda: select(Appointment)
+    .where(Appointment.patient_id == 1)
+    .order_by(Appointment.date_scheduled.desc()),
+    "doctor weekly schedule": lambda: select(DoctorAvailability).where(
+        DoctorAvailability.doctor_id == 1
+    ),
+    "doctor availability exceptions": lambda: select(AvailabilityException).where(
+        AvailabilityException.doctor_id == 1,
+        AvailabilityException.date >= date(2025, 1, 1),
+        AvailabilityException.date <= date(2025, 1, 7),
+    ),
+    "booking slot lookup": lambda: select(Appointment).where(
+        Appointment.doctor_id == 1,
+        Appointment.date_scheduled == date(2025, 1, 1),
+        Appointment.time_scheduled == time(9, 0),
+    ),
+    "admin appointments page": lambda: select(Appointment)
+    .where(tuple_(Appointment.date_scheduled, Appointment.id) < (date(2025, 1, 1), 100))
+    .order_by(Appointment.date_scheduled.desc(), Appointment.id.desc())
+    .limit(26),
+    "department doctors": lambda: select(Doctor).where(Doctor.department_id == 1),
+    "doctor profile by user": lambda: select(Doctor).where(Doctor.user_id == 1),
+    "patient profile by user": lambda: select(Patient).where(Patient.user_id == 1),
+    "appointment treatment": lambda: select(Treatment).where(
+        Treatment.appointment_id == 1
+    ),
+    "department chart": lambda: select(Department.name, func.sum(STAT.c.count))
+    .outerjoin(STAT, STAT.c.department_id == Department.id)
+    .group_by(Department.id, Department.name),
+    "stats trend": lambda: select(STAT.c.day, STAT.c.status, func.sum(STAT.c.count))
+    .where(STAT.c.day >= date(2025, 1, 1), STAT.c.day <= date(2025, 1, 31))
+    .group_by(STAT.c.day, STAT.c.status),
+    "job queue claim": lambda: select(Job.id)
+    .where(Job.status == "pending", Job.run_at <= datetime(2025, 1, 1))
+    .order_by(Job.run_at, Job.id)
+    .limit(50),
+}
+
+
+def explain(conn, statement):
+    compiled = statement.compile(
+        dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+    )
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").fetchall()
+    return [row[-1] for row in rows]
+
+
+def check_plans(engine):
+    """Return {query name: [offending plan lines]} for queries with full scans."""
+    if engine.dialect.name != "sqlite":
+        raise RuntimeError("Query plan checks currently support SQLite only")
+
+    failures = {}
+    with engine.connect() as conn:
+        for name, build in HOT_QUERIES.items():
+            bad = [line for line in explain(conn, build()) if FULL_SCAN.search(line)]
+            if bad:
+                failures[name] = bad
+    return failures
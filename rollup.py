@@ -0,0 +1,226 @@
+"""
+Daily appointment counts per (day, department, doctor, status).
+
+Charts and /api/stats read `appointment_daily_stat`, whose size grows with
+days x doctors x statuses, instead of scanning `appointment`. The rollup is
+maintained by an `after_flush` hook: every appointment the ORM inserts,
+deletes, reschedules or moves to a new status adjusts the affected counters
+in the same transaction. That covers BookAppointment, RescheduleAppointment,
+the cancel routes, AddTreatment, AdminDeleteAppt and cascading deletes of
+doctors and patients, and no route has to remember to do it.
+
+A doctor belongs to one department, so the department is stored alongside
+each counter and updated when the doctor moves or the department is deleted.
+Writes that bypass the ORM (raw SQL, bulk `Query.update`) are not seen; run
+`flask rebuild-stats` after them.
+"""
+
+from collections import Counter
+from datetime import date, timedelta
+
+from sqlalchemy import delete, event, func, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import Appointment, AppointmentDailyStat, Department, Doctor
+
+STAT = AppointmentDailyStat.__table__
+DEFAULT_STATUS = "Scheduled"
+GROUPS = ("status", "department", "doctor")
+MAX_DAYS = 731
+
+_UPSERT = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+class InvalidStatsQuery(ValueError):
+    pass
+
+
+def parse_date(raw, name):
+    if not raw:
+        return None
+    try:
+        return date.fromisoformat(raw)
+    except ValueError:
+        raise InvalidStatsQuery(f"{name} must be a date like 2024-01-31") from None
+
+
+def _value(obj, name, old):
+    history = inspect(obj).attrs[name].history
+    if old and history.deleted:
+        return history.deleted[0]
+    return getattr(obj, name)
+
+
+def _key(appt, old=False):
+    return (
+        _value(appt, "date_scheduled", old),
+        _value(appt, "doctor_id", old),
+        _value(appt, "status", old) or DEFAULT_STATUS,
+    )
+
+
+def _department_of(doctor_id):
+    return select(Doctor.department_id).where(Doctor.id == doctor_id).scalar_subquery()
+
+
+def _add(conn, key, delta):
+    day, doctor_id, status = key
+    where = (STAT.c.day == day, STAT.c.doctor_id == doctor_id, STAT.c.status == status)
+    upsert = _UPSERT.get(conn.dialect.name)
+    if upsert is not None:
+        stmt = upsert(STAT).values(
+            day=day,
+            doctor_id=doctor_id,
+            status=status,
+            department_id=_department_of(doctor_id),
+            count=delta,
+        )
+        conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[STAT.c.day, STAT.c.doctor_id, STAT.c.status],
+                set_={"count": STAT.c.count + stmt.excluded.count},
+            )
+        )
+    else:
+        result = conn.execute(
+            update(STAT).where(*where).values(count=STAT.c.count + delta)
+        )
+        if result.rowcount == 0:
+            conn.execute(
+                STAT.insert().values(
+                    day=day,
+                    doctor_id=doctor_id,
+                    status=status,
+                    department_id=_department_of(doctor_id),
+                    count=delta,
+                )
+            )
+    if delta < 0:
+        conn.execute(delete(STAT).where(*where, STAT.c.count <= 0))
+
+
+@event.listens_for(Session, "after_flush")
+def _update_rollup(session, flush_context):
+    deltas = Counter()
+    moved_doctors, removed_departments = set(), set()
+
+    for obj in session.new:
+        if isinstance(obj, Appointment):
+            deltas[_key(obj)] += 1
+    for obj in session.dirty:
+        if isinstance(obj, Appointment):
+            old, new = _key(obj, old=True), _key(obj)
+            if old != new:
+                deltas[old] -= 1
+                deltas[new] += 1
+        elif isinstance(obj, Doctor):
+            if inspect(obj).attrs.department_id.history.has_changes():
+                moved_doctors.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, Appointment):
+            deltas[_key(obj, old=True)] -= 1
+        elif isinstance(obj, Department):
+            removed_departments.add(obj.id)
+
+    if not (any(deltas.values()) or moved_doctors or removed_departments):
+        return
+
+    conn = session.connection()
+    for key, delta in deltas.items():
+        if delta:
+            _add(conn, key, delta)
+    if moved_doctors:
+        conn.execute(
+            update(STAT)
+            .where(STAT.c.doctor_id.in_(moved_doctors))
+            .values(department_id=_department_of(STAT.c.doctor_id))
+        )
+    if removed_departments:
+        conn.execute(
+            update(STAT)
+            .where(STAT.c.department_id.in_(removed_departments))
+            .values(department_id=None)
+        )
+
+
+def rebuild(conn):
+    """Recompute the whole rollup from `appointment`. Returns the row count."""
+    status = func.coalesce(Appointment.status, DEFAULT_STATUS)
+    source = (
+        select(
+            Appointment.date_scheduled,
+            Appointment.doctor_id,
+            status,
+            Doctor.department_id,
+            func.count(Appointment.id),
+        )
+        .outerjoin(Doctor, Doctor.id == Appointment.doctor_id)
+        .group_by(
+            Appointment.date_scheduled,
+            Appointment.doctor_id,
+            status,
+            Doctor.department_id,
+        )
+    )
+    conn.execute(delete(STAT))
+    conn.execute(
+        STAT.insert().from_select(
+            ["day", "doctor_id", "status", "department_id", "count"], source
+        )
+    )
+    return conn.execute(select(func.count()).select_from(STAT)).scalar()
+
+
+def department_totals(session):
+    """(department name, appointments) for every department, from the rollup."""
+    return (
+        session.query(Department.name, func.coalesce(func.sum(STAT.c.count), 0))
+        .outerjoin(STAT, STAT.c.department_id == Department.id)
+        .group_by(Department.id, Department.name)
+        .order_by(Department.id)
+        .all()
+    )
+
+
+def trend(session, start, end, group_by="status", department_id=None, doctor_id=None):
+    """
+    Daily counts from `start` to `end` inclusive, one series per group.
+
+    Returns {"days": [...], "series": {label: [count per day]}}, with zeros
+    for days without appointments.
+    """
+    if group_by not in GROUPS:
+        raise InvalidStatsQuery(f"group_by must be one of {', '.join(GROUPS)}")
+    if start > end:
+        raise InvalidStatsQuery("start must not be after end")
+    if (end - start).days >= MAX_DAYS:
+        raise InvalidStatsQuery(f"date range is limited to {MAX_DAYS} days")
+
+    if group_by == "status":
+        label = STAT.c.status
+        query = session.query(STAT.c.day, label, func.sum(STAT.c.count))
+    elif group_by == "department":
+        label = func.coalesce(Department.name, "None")
+        query = session.query(STAT.c.day, label, func.sum(STAT.c.count)).outerjoin(
+            Department, Department.id == STAT.c.department_id
+        )
+    else:
+        label = Doctor.full_name
+        query = session.query(STAT.c.day, label, func.sum(STAT.c.count)).join(
+            Doctor, Doctor.id == STAT.c.doctor_id
+        )
+
+    query = query.filter(STAT.c.day >= start, STAT.c.day <= end)
+    if department_id is not None:
+        query = query.filter(STAT.c.department_id == department_id)
+    if doctor_id is not None:
+        query = query.filter(STAT.c.doctor_id == doctor_id)
+    rows = query.group_by(STAT.c.day, label).order_by(STAT.c.day).all()
+
+    days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+    index = {day: n for n, day in enumerate(days)}
+    series = {}
+    for day, name, total in rows:
+        series.setdefault(name, [0] * len(days))[index[day]] += int(total)
+    return {"days": [day.isoformat() for day in days], "series": series}
@@ -0,0 +1,85 @@
+"""
+Doctor roster queries for the public /api/doctors endpoint.
+
+Every mode (full list, cursor pages, NDJSON stream) runs the same single
+query: doctor columns with the department name from an outer join, filtered
+and ordered by id so it can be keyset-paginated or streamed in batches.
+"""
+
+from sqlalchemy import select
+
+from models import Department, Doctor, db
+
+FIELDS = ("id", "name", "department_id", "department", "qualification")
+DEFAULT_FIELDS = ("id", "name", "department", "qualification")
+STREAM_BATCH_SIZE = 500
+
+
+class InvalidRosterQuery(ValueError):
+    pass
+
+
+def parse_fields(raw):
+    if not raw:
+        return DEFAULT_FIELDS
+    fields = tuple(f.strip() for f in raw.split(",") if f.strip())
+    unknown = [f for f in fields if f not in FIELDS]
+    if unknown or not fields:
+        raise InvalidRosterQuery(
+            f"Unknown fields: {', '.join(unknown)}. Choose from {', '.join(FIELDS)}"
+        )
+    return fields
+
+
+def parse_department_id(raw):
+    if raw in (None, ""):
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        raise InvalidRosterQuery("department_id must be an integer") from None
+
+
+COLUMNS = (
+    Doctor.id,
+    Doctor.full_name,
+    Doctor.department_id,
+    Doctor.qualification,
+    Department.name.label("department"),
+)
+
+
+def _filtered(query, department_id, qualification):
+    query = query.outerjoin(Department, Doctor.department_id == Department.id)
+    if department_id is not None:
+        query = query.filter(Doctor.department_id == department_id)
+    if qualification:
+        query = query.filter(
+            Doctor.qualification.icontains(qualification, autoescape=True)
+        )
+    return query
+
+
+def roster_query(department_id=None, qualification=None):
+    return _filtered(db.session.query(*COLUMNS), department_id, qualification)
+
+
+def roster_select(department_id=None, qualification=None):
+    """The same query as a select(), for sessions outside Flask (see asgi.py)."""
+    return _filtered(select(*COLUMNS), department_id, qualification)
+
+
+def serialize(row, fields):
+    record = {
+        "id": row.id,
+        "name": row.full_name,
+        "department_id": row.department_id,
+        "department": row.department or "None",
+        "qualification": row.qualification,
+    }
+    return {field: record[field] for field in fields}
+
+
+def stream(query):
+    """Yield rows in id order, STREAM_BATCH_SIZE at a time, without buffering."""
+    return query.order_by(Doctor.id).yield_per(STREAM_BATCH_SIZE)
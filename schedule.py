@@ -0,0 +1,268 @@
+"""
+Bulk weekly schedule templates for doctor availability.
+
+A template replaces a doctor's whole week in one request:
+
+    {
+        "weekly": {"Monday": [{"start": "09:00", "end": "12:00"},
+                              {"start": "14:00", "end": "17:00"}],
+                   "Tuesday": [...]},
+        "exceptions": {"2025-12-25": [],
+                       "2025-12-31": [{"start": "09:00", "end": "12:00"}]}
+    }
+
+Days missing from "weekly" have no hours. "exceptions" is optional. When it
+is present it replaces every upcoming exception: an empty list marks the
+doctor off for that date, and intervals replace that date's weekly hours.
+Past exceptions are left alone.
+
+The whole template is validated in memory first (formats, start < end, and no
+overlapping intervals on a day), and every problem is reported together.
+It is then diffed against the stored rows. Intervals that did not change keep
+their rows; the rest are removed and inserted with one batched DELETE and one
+executemany INSERT per table, all in a single transaction.
+"""
+
+from datetime import date, datetime
+
+from sqlalchemy import delete, insert
+
+from models import AvailabilityException, DoctorAvailability, db
+
+WEEKDAYS = (
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+)
+
+
+class ScheduleError(ValueError):
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+def _parse_time(raw):
+    for fmt in ("%H:%M", "%H:%M:%S"):
+        try:
+            return datetime.strptime(raw, fmt).time()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _parse_intervals(label, raw, errors):
+    """[{"start", "end"}, ...] -> sorted [(start, end), ...], recording errors."""
+    if not isinstance(raw, list):
+        errors.append(f"{label}: expected a list of intervals")
+        return []
+
+    intervals = []
+    for n, item in enumerate(raw):
+        item = item if isinstance(item, dict) else {}
+        start, end = _parse_time(item.get("start")), _parse_time(item.get("end"))
+        if start is None or end is None:
+            errors.append(f"{label}[{n}]: start and end must be times like 09:30")
+        elif start >= end:
+            errors.append(f"{label}[{n}]: start must be before end")
+        else:
+            intervals.append((start, end))
+
+    intervals.sort()
+    for (start, end), (next_start, next_end) in zip(intervals, intervals[1:]):
+        if next_start < end:
+            errors.append(
+                f"{label}: {start:%H:%M}-{end:%H:%M} overlaps "
+                f"{next_start:%H:%M}-{next_end:%H:%M}"
+            )
+    return intervals
+
+
+def parse_template(payload, today=None):
+    """
+    Validate a template. Returns (weekly, exceptions): weekly maps every
+    weekday to its intervals, and exceptions maps dates to intervals, or is
+    None when the template leaves exceptions alone. Raises ScheduleError.
+    """
+    today = today or date.today()
+    errors = []
+    if not isinstance(payload, dict):
+        raise ScheduleError(["body must be a JSON object"])
+
+    raw_weekly = payload.get("weekly")
+    if not isinstance(raw_weekly, dict):
+        errors.append("weekly: expected an object keyed by weekday")
+        raw_weekly = {}
+    unknown = [day for day in raw_weekly if day not in WEEKDAYS]
+    if unknown:
+        errors.append(f"weekly: unknown days {', '.join(map(str, unknown))}")
+    weekly = {
+        day: _parse_intervals(day, raw_weekly.get(day, []), errors) for day in WEEKDAYS
+    }
+
+    exceptions = None
+    if "exceptions" in payload:
+        raw_exceptions = payload["exceptions"]
+        if not isinstance(raw_exceptions, dict):
+            errors.append("exceptions: expected an object keyed by date")
+            raw_exceptions = {}
+        exceptions = {}
+        for raw_day, raw in raw_exceptions.items():
+            try:
+                day = date.fromisoformat(raw_day)
+            except ValueError:
+                errors.append(f"exceptions: {raw_day!r} is not a date like 2025-12-25")
+                continue
+            if day < today:
+                errors.append(f"exceptions: {raw_day} is in the past")
+                continue
+            exceptions[day] = _parse_intervals(raw_day, raw, errors)
+
+    if errors:
+        raise ScheduleError(errors)
+    return weekly, exceptions
+
+
+def _diff(existing, wanted):
+    """
+    existing: [(key, row id)]; wanted: set of keys. Returns (stale ids, new
+    keys). Duplicate rows for one key, left by the old one-row-per-post form,
+    are stale too.
+    """
+    kept, stale = set(), []
+    for key, row_id in existing:
+        if key in wanted and key not in kept:
+            kept.add(key)
+        else:
+            stale.append(row_id)
+    return stale, sorted(wanted - kept)
+
+
+def apply_template(doctor_id, weekly, exceptions=None, today=None):
+    """
+    Bring the stored schedule in line with a parsed template and commit.
+    Returns {"added": n, "removed": n, "unchanged": n}.
+    """
+    today = today or date.today()
+    session = db.session
+
+    current = [
+        ((row.day_of_week, row.start_time, row.end_time), row.id)
+        for row in session.query(
+            DoctorAvailability.id,
+            DoctorAvailability.day_of_week,
+            DoctorAvailability.start_time,
+            DoctorAvailability.end_time,
+        ).filter(DoctorAvailability.doctor_id == doctor_id)
+    ]
+    wanted = {
+        (day, start, end)
+        for day, intervals in weekly.items()
+        for start, end in intervals
+    }
+    stale, new = _diff(current, wanted)
+    changes = {"added": len(new), "removed": len(stale)}
+    unchanged = len(current) - len(stale)
+
+    if stale:
+        session.execute(
+            delete(DoctorAvailability).where(DoctorAvailability.id.in_(stale))
+        )
+    if new:
+        session.execute(
+            insert(DoctorAvailability),
+            [
+                {
+                    "doctor_id": doctor_id,
+                    "day_of_week": day,
+                    "start_time": start,
+                    "end_time": end,
+                    "is_available": True,
+                }
+                for day, start, end in new
+            ],
+        )
+
+    if exceptions is not None:
+        current = [
+            ((row.date, row.start_time, row.end_time), row.id)
+            for row in session.query(
+                AvailabilityException.id,
+                AvailabilityException.date,
+                AvailabilityException.start_time,
+                AvailabilityException.end_time,
+            ).filter(
+                AvailabilityException.doctor_id == doctor_id,
+                AvailabilityException.date >= today,
+            )
+        ]
+        # A day off is stored as one row without times.
+        wanted = {
+            (day, start, end)
+            for day, intervals in exceptions.items()
+            for start, end in (intervals or [(None, None)])
+        }
+        stale, new = _diff(current, wanted)
+        changes["added"] += len(new)
+        changes["removed"] += len(stale)
+        unchanged += len(current) - len(stale)
+
+        if stale:
+            session.execute(
+                delete(AvailabilityException).where(AvailabilityException.id.in_(stale))
+            )
+        if new:
+            session.execute(
+                insert(AvailabilityException),
+                [
+                    {
+                        "doctor_id": doctor_id,
+                        "date": day,
+                        "start_time": start,
+                        "end_time": end,
+                    }
+                    for day, start, end in new
+                ],
+            )
+
+    session.commit()
+    changes["unchanged"] = unchanged
+    return changes
+
+
+def _interval(start, end):
+    return {"start": start.strftime("%H:%M"), "end": end.strftime("%H:%M")}
+
+
+def schedule_grid(doctor_id, today=None):
+    """The stored schedule in template form, weekdays in calendar order."""
+    today = today or date.today()
+    weekly = {day: [] for day in WEEKDAYS}
+    rows = (
+        DoctorAvailability.query.filter_by(doctor_id=doctor_id)
+        .order_by(DoctorAvailability.start_time)
+        .all()
+    )
+    for row in rows:
+        weekly.setdefault(row.day_of_week, []).append(
+            _interval(row.start_time, row.end_time)
+        )
+
+    exceptions = {}
+    rows = (
+        AvailabilityException.query.filter(
+            AvailabilityException.doctor_id == doctor_id,
+            AvailabilityException.date >= today,
+        )
+        .order_by(AvailabilityException.date, AvailabilityException.start_time)
+        .all()
+    )
+    for row in rows:
+        hours = exceptions.setdefault(row.date.isoformat(), [])
+        if row.start_time is not None:
+            hours.append(_interval(row.start_time, row.end_time))
+    return {"weekly": weekly, "exceptions": exceptions}
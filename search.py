@@ -0,0 +1,259 @@
+"""
+Full-text search over patients, doctors and treatment records.
+
+On SQLite, migration 4 creates two FTS5 indexes, `patient_search` and
+`doctor_search`, keyed by the profile id (the FTS rowid). Triggers on
+patient, doctor and user keep them in step with every write, including raw
+SQL and bulk imports. Every word of the query is matched as a prefix, so
+"jo sm" finds "John Smith". Results come back ranked by bm25, with name and
+username matches weighted above address or qualification matches.
+
+Migration 5 adds `treatment_search`, an external-content index over the
+treatment text columns that reads from the treatment table rather than
+storing a copy. Triggers keep it in step, so each new record from
+AddTreatment is indexed in the same transaction. Record searches are scoped
+to one doctor or unscoped for admins, page newest first and return snippets
+with the matched words marked.
+
+Other databases have no FTS5. There, the same functions fall back to
+case-insensitive substring filters. These are correct but scan the table.
+"""
+
+import re
+from types import SimpleNamespace
+
+from markupsafe import Markup, escape
+from sqlalchemy import or_, text
+
+from models import Appointment, Department, Doctor, Patient, Treatment, User, db
+from pagination import decode_cursor, encode_cursor
+
+MAX_TERMS = 8
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# bm25 column weights, in index column order.
+PATIENT_WEIGHTS = "10.0, 2.0, 1.0, 5.0"  # full_name, phone, address, username
+DOCTOR_WEIGHTS = "10.0, 3.0, 5.0"  # full_name, qualification, username
+
+PATIENT_SQL = text(
+    "SELECT p.id, p.full_name, p.phone, p.address, u.username "
+    "FROM patient_search s "
+    "JOIN patient p ON p.id = s.rowid "
+    'JOIN "user" u ON u.id = p.user_id '
+    "WHERE patient_search MATCH :match "
+    f"ORDER BY bm25(patient_search, {PATIENT_WEIGHTS}), p.id "
+    "LIMIT :limit"
+)
+
+DOCTOR_SQL = text(
+    "SELECT d.id, d.full_name, d.qualification, u.username, "
+    "dep.name AS department "
+    "FROM doctor_search s "
+    "JOIN doctor d ON d.id = s.rowid "
+    'JOIN "user" u ON u.id = d.user_id '
+    "LEFT JOIN department dep ON dep.id = d.department_id "
+    "WHERE doctor_search MATCH :match "
+    f"ORDER BY bm25(doctor_search, {DOCTOR_WEIGHTS}), d.id "
+    "LIMIT :limit"
+)
+
+
+TREATMENT_FIELDS = ("diagnosis", "prescription", "notes", "tests_done")
+SNIPPET_TOKENS = 16
+# snippet() wraps matches in these so the text can be escaped before the
+# <mark> tags go in.
+MARK_START, MARK_END = "\x02", "\x03"
+
+TREATMENT_SQL = (
+    "SELECT t.id, t.appointment_id, a.date_scheduled, a.patient_id, "
+    "p.full_name AS patient, d.full_name AS doctor, "
+    "snippet(treatment_search, -1, char(2), char(3), '…', "
+    f"{SNIPPET_TOKENS}) AS snippet "
+    "FROM treatment_search "
+    "JOIN treatment t ON t.id = treatment_search.rowid "
+    "JOIN appointment a ON a.id = t.appointment_id "
+    "JOIN patient p ON p.id = a.patient_id "
+    "JOIN doctor d ON d.id = a.doctor_id "
+    "WHERE treatment_search MATCH :match{filters} "
+    "ORDER BY treatment_search.rowid DESC "
+    "LIMIT :limit"
+)
+
+
+class InvalidSearch(ValueError):
+    pass
+
+
+def terms(raw):
+    """Split user input into lowercase words, dropping FTS syntax characters."""
+    return re.findall(r"\w+", (raw or "").lower())[:MAX_TERMS]
+
+
+def match_expression(words, column=None):
+    """'jo sm' -> '"jo"* "sm"*': every word must match as a prefix."""
+    expression = " ".join(f'"{word}"*' for word in words)
+    if column:
+        return f"{{{column}}} : ({expression})"
+    return expression
+
+
+def highlight(snippet):
+    """Escape a snippet and turn the match markers into <mark> tags."""
+    escaped = str(escape(snippet or ""))
+    return Markup(escaped.replace(MARK_START, "<mark>").replace(MARK_END, "</mark>"))
+
+
+def clamp_limit(raw, default=DEFAULT_LIMIT):
+    try:
+        limit = int(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _uses_fts():
+    return db.session.get_bind().dialect.name == "sqlite"
+
+
+def _contains_all(words, columns):
+    return [
+        or_(*(column.icontains(word, autoescape=True) for column in columns))
+        for word in words
+    ]
+
+
+def search_patients(raw, limit=DEFAULT_LIMIT):
+    words = terms(raw)
+    if not words:
+        return []
+    if _uses_fts():
+        params = {"match": match_expression(words), "limit": limit}
+        return db.session.execute(PATIENT_SQL, params).all()
+
+    columns = (Patient.full_name, Patient.phone, Patient.address, User.username)
+    return (
+        db.session.query(
+            Patient.id, Patient.full_name, Patient.phone, Patient.address, User.username
+        )
+        .join(User, User.id == Patient.user_id)
+        .filter(*_contains_all(words, columns))
+        .order_by(Patient.full_name, Patient.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def search_doctors(raw, limit=DEFAULT_LIMIT):
+    words = terms(raw)
+    if not words:
+        return []
+    if _uses_fts():
+        params = {"match": match_expression(words), "limit": limit}
+        return db.session.execute(DOCTOR_SQL, params).all()
+
+    columns = (Doctor.full_name, Doctor.qualification, User.username)
+    return (
+        db.session.query(
+            Doctor.id,
+            Doctor.full_name,
+            Doctor.qualification,
+            User.username,
+            Department.name.label("department"),
+        )
+        .join(User, User.id == Doctor.user_id)
+        .outerjoin(Department, Department.id == Doctor.department_id)
+        .filter(*_contains_all(words, columns))
+        .order_by(Doctor.full_name, Doctor.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def _plain_snippet(texts, words):
+    """Snippet for the LIKE fallback: the first field that matches, marked up."""
+    pattern = re.compile("|".join(re.escape(word) for word in words), re.IGNORECASE)
+    for value in texts:
+        found = pattern.search(value or "")
+        if found:
+            start, end = max(0, found.start() - 60), found.end() + 60
+            excerpt = value[start:end]
+            marked = pattern.sub(lambda m: MARK_START + m.group(0) + MARK_END, excerpt)
+            return ("…" if start else "") + marked
+    return ""
+
+
+def search_treatments(raw, doctor_id=None, field=None, after=None, limit=20):
+    """
+    Treatment records matching every word of `raw`, newest first.
+
+    Doctors pass their own `doctor_id`; admins pass None to search every
+    record. `field` limits the match to one of TREATMENT_FIELDS. Pages are
+    keyset-paginated on the treatment id. Returns (rows, next_cursor); each
+    row has id, appointment_id, date_scheduled, patient_id, patient, doctor
+    and snippet (a raw snippet, see `highlight`).
+    """
+    if field and field not in TREATMENT_FIELDS:
+        raise InvalidSearch(f"field must be one of {', '.join(TREATMENT_FIELDS)}")
+    words = terms(raw)
+    if not words:
+        return [], None
+    bound = decode_cursor(after, [Treatment.id])[0] if after else None
+
+    if _uses_fts():
+        filters, params = "", {"match": match_expression(words, field)}
+        if doctor_id is not None:
+            filters += " AND a.doctor_id = :doctor_id"
+            params["doctor_id"] = doctor_id
+        if bound is not None:
+            filters += " AND treatment_search.rowid < :after"
+            params["after"] = bound
+        params["limit"] = limit + 1
+        statement = text(TREATMENT_SQL.format(filters=filters))
+        statement = statement.columns(date_scheduled=db.Date)
+        rows = db.session.execute(statement, params).all()
+    else:
+        rows = _search_treatments_like(words, doctor_id, field, bound, limit + 1)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1].id])
+    return rows, next_cursor
+
+
+def _search_treatments_like(words, doctor_id, field, bound, limit):
+    fields = (field,) if field else TREATMENT_FIELDS
+    columns = [getattr(Treatment, name) for name in fields]
+    query = (
+        db.session.query(
+            Treatment.id,
+            Treatment.appointment_id,
+            Appointment.date_scheduled,
+            Appointment.patient_id,
+            Patient.full_name.label("patient"),
+            Doctor.full_name.label("doctor"),
+            *columns,
+        )
+        .join(Appointment, Appointment.id == Treatment.appointment_id)
+        .join(Patient, Patient.id == Appointment.patient_id)
+        .join(Doctor, Doctor.id == Appointment.doctor_id)
+        .filter(*_contains_all(words, columns))
+    )
+    if doctor_id is not None:
+        query = query.filter(Appointment.doctor_id == doctor_id)
+    if bound is not None:
+        query = query.filter(Treatment.id < bound)
+
+    return [
+        SimpleNamespace(
+            id=row.id,
+            appointment_id=row.appointment_id,
+            date_scheduled=row.date_scheduled,
+            patient_id=row.patient_id,
+            patient=row.patient,
+            doctor=row.doctor,
+            snippet=_plain_snippet([getattr(row, name) for name in fields], words),
+        )
+        for row in query.order_by(Treatment.id.desc()).limit(limit)
+    ]
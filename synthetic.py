@@ -0,0 +1,387 @@
+"""
+Deterministic synthetic data for scale testing (`flask seed`).
+
+Generates departments, doctors with weekly availability templates, patients,
+appointments spread over several years and treatment records for completed
+visits. The same seed, sizes and anchor date always produce the same rows
+(only the password salts differ), on any day, so a slow query or memory
+problem found on a seeded database can be reproduced. The anchor date plays
+the part of "today": visits before it are in the past, and the schedule runs
+FUTURE_DAYS past it. It defaults to the fixed ANCHOR_DATE; pass today's date
+for data that looks current in the app.
+
+Each doctor works a few days a week in one shift, and appointments fill a
+sample of that doctor's 30-minute slots, so no slot is double-booked and
+the booking grid looks like production. Past visits are mostly completed,
+some cancelled, and a few were never closed; future visits are scheduled,
+with the occasional cancellation. A minority of patients account for most
+visits.
+
+Rows are generated lazily and inserted through SQLAlchemy Core executemany
+in batches, bypassing the ORM unit of work, so millions of rows take
+minutes rather than hours. Ids are taken from a block of ID_BLOCK ids per
+seed (seed 1 starts at 10000001) rather than after the rows already in the
+tables, so the generated rows do not depend on what the database holds. A
+seed whose block is already in use is refused. Departments are the one
+exception: existing ones are reused by name. The search indexes are kept up
+to date by their triggers. The statistics rollup is rebuilt at the end,
+because Core inserts do not go through its ORM hook.
+"""
+
+import random
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as clock
+
+from sqlalchemy import select
+from werkzeug.security import generate_password_hash
+
+import rollup
+import versioning
+from models import (
+    Appointment,
+    Department,
+    Doctor,
+    DoctorAvailability,
+    Patient,
+    Treatment,
+    User,
+    db,
+)
+
+BATCH_SIZE = 10000
+ANCHOR_DATE = date(2025, 1, 1)
+# Ids per table per seed. Seeds up to MAX_SEED keep every id within a 32-bit
+# integer column.
+ID_BLOCK = 10_000_000
+MAX_SEED = 2**31 // ID_BLOCK - 1
+FUTURE_DAYS = 60
+SLOT_MINUTES = 30
+
+DEPARTMENTS = (
+    ("Cardiology", "Heart and blood vessel disorders."),
+    ("Neurology", "Brain, spinal cord and nerve disorders."),
+    ("Orthopedics", "Bones, joints and muscles."),
+    ("Pediatrics", "Medical care for infants and children."),
+    ("Dermatology", "Skin, hair and nail conditions."),
+    ("General Medicine", "First point of contact for adults."),
+    ("ENT", "Ear, nose and throat."),
+    ("Gynecology", "Women's reproductive health."),
+    ("Ophthalmology", "Eye care and vision."),
+    ("Psychiatry", "Mental health."),
+    ("Pulmonology", "Lungs and breathing."),
+    ("Gastroenterology", "Digestive system."),
+)
+FIRST_NAMES = (
+    "Aarav Aditi Amit Ananya Arjun Deepa Divya Farhan Gaurav Isha Karan Kavya "
+    "Meera Mohit Neha Nikhil Pooja Priya Rahul Riya Rohan Sahil Sanjay Sara "
+    "Shreya Sneha Tanvi Varun Vikram Zoya"
+).split()
+LAST_NAMES = (
+    "Agarwal Bareja Bhatia Chopra Das Desai Gupta Iyer Jain Joshi Kapoor "
+    "Khan Kumar Malhotra Mehta Menon Mishra Nair Patel Rao Reddy Saxena "
+    "Sharma Singh Sinha Verma"
+).split()
+QUALIFICATIONS = ("MBBS", "MBBS, MD", "MBBS, MS", "MBBS, DNB", "MBBS, MD, DM")
+CITIES = ("Delhi", "Mumbai", "Pune", "Jaipur", "Lucknow", "Chandigarh", "Kochi")
+WEEKDAYS = (
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+)
+SHIFTS = ((clock(9), clock(13)), (clock(14), clock(18)), (clock(10), clock(17)))
+CASES = (
+    ("Viral fever", "Paracetamol 500mg, rest and fluids", "CBC"),
+    ("Hypertension", "Amlodipine 5mg daily", "ECG, lipid profile"),
+    ("Type 2 diabetes", "Metformin 500mg twice daily", "HbA1c"),
+    ("Migraine", "Sumatriptan as needed", None),
+    ("Lower back pain", "Physiotherapy, ibuprofen", "X-Ray"),
+    ("Asthma", "Salbutamol inhaler", "Spirometry"),
+    ("Gastritis", "Pantoprazole 40mg before breakfast", None),
+    ("Allergic rhinitis", "Cetirizine 10mg at night", None),
+    ("Ankle sprain", "Rest, ice, compression", "X-Ray"),
+    ("Eczema", "Topical corticosteroid cream", None),
+    ("Anxiety", "Counselling, follow-up in four weeks", None),
+    ("Conjunctivitis", "Antibiotic eye drops", None),
+)
+VISIT_TYPES = ("In-person",) * 8 + ("Online",) * 3 + ("Emergency",)
+NOTES = (None, None, "Follow up in two weeks.", "Reviewed previous reports.")
+
+
+class SeedError(ValueError):
+    pass
+
+
+def _check_id_block(conn, tables, first_id, rng_seed):
+    last_id = first_id + ID_BLOCK - 1
+    for table in tables:
+        taken = conn.execute(
+            select(table.c.id).where(table.c.id.between(first_id, last_id)).limit(1)
+        ).first()
+        if taken:
+            raise SeedError(
+                f"ids {first_id}-{last_id} for seed {rng_seed} are already used in "
+                f"{table.name}; seed with another --seed"
+            )
+
+
+def _name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def _username(name, row_id):
+    return f"{name.lower().replace(' ', '.')}.{row_id}"
+
+
+def _slots(start, end):
+    minutes = start.hour * 60 + start.minute
+    last = end.hour * 60 + end.minute
+    while minutes + SLOT_MINUTES <= last:
+        yield clock(minutes // 60, minutes % 60)
+        minutes += SLOT_MINUTES
+
+
+def _schedule(rng):
+    """A doctor's weekly template: {weekday index: (shift start, shift end)}."""
+    days = sorted(rng.sample(range(7), rng.randint(4, 6)))
+    shift = rng.choice(SHIFTS)
+    return {day: shift for day in days}
+
+
+def _visit_status(rng, day, anchor_date):
+    roll = rng.random()
+    if day >= anchor_date:
+        return "Cancelled" if roll < 0.05 else "Scheduled"
+    if roll < 0.8:
+        return "Completed"
+    return "Cancelled" if roll < 0.95 else "Scheduled"
+
+
+def _patient_for(rng, patient_ids):
+    # Squaring skews towards the first patients: a minority of frequent
+    # visitors and a long tail of occasional ones.
+    return patient_ids[int(len(patient_ids) * rng.random() ** 2)]
+
+
+class _Batcher:
+    """Buffers rows per table and inserts them with executemany."""
+
+    def __init__(self, conn, size):
+        self.conn = conn
+        self.size = size
+        self.pending = {}
+        self.inserted = {}
+
+    def add(self, table, row):
+        rows = self.pending.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= self.size:
+            self.flush()
+
+    def flush(self):
+        # Insertion order follows registration order, so parents (appointments)
+        # always reach the database before their children (treatments).
+        for table, rows in self.pending.items():
+            if rows:
+                self.conn.execute(table.insert(), rows)
+                self.inserted[table.name] = self.inserted.get(table.name, 0) + len(rows)
+                rows.clear()
+
+
+def generate(
+    doctors,
+    patients,
+    appointments,
+    years=3,
+    rng_seed=1,
+    password="password",
+    batch_size=BATCH_SIZE,
+    anchor_date=ANCHOR_DATE,
+    echo=print,
+):
+    """
+    Insert the synthetic data set and commit. Every user gets `password`.
+    Returns {table name: rows inserted}. Raises SeedError for impossible sizes
+    or a seed whose ids are already taken.
+    """
+    if doctors < 1 or patients < 1 or appointments < 0 or years < 1:
+        raise SeedError("need at least one doctor, one patient and one year")
+    # Availability rows are the most a doctor can have: one per weekday.
+    if max(doctors * 7, doctors + patients, appointments) > ID_BLOCK:
+        raise SeedError(f"these sizes need more than the {ID_BLOCK} ids of a seed")
+    if not 0 <= rng_seed <= MAX_SEED:
+        raise SeedError(f"the seed must be between 0 and {MAX_SEED}")
+
+    rng = random.Random(rng_seed)
+    first_day = anchor_date - timedelta(days=365 * years)
+    span = (anchor_date + timedelta(days=FUTURE_DAYS) - first_day).days
+    started = time.perf_counter()
+    hashed = generate_password_hash(password, method="pbkdf2:sha256")
+
+    conn = db.session.connection()
+    batch = _Batcher(conn, batch_size)
+    users, doctor_table = User.__table__, Doctor.__table__
+    patient_table, appointment_table = Patient.__table__, Appointment.__table__
+    treatment_table = Treatment.__table__
+    availability_table = DoctorAvailability.__table__
+    # Register appointments before treatments; see _Batcher.flush.
+    batch.pending = {appointment_table: [], treatment_table: []}
+
+    first_id = rng_seed * ID_BLOCK + 1
+    _check_id_block(
+        conn,
+        [
+            users,
+            doctor_table,
+            patient_table,
+            availability_table,
+            appointment_table,
+            treatment_table,
+        ],
+        first_id,
+        rng_seed,
+    )
+
+    existing = dict(conn.execute(select(Department.name, Department.id)).all())
+    for n, (name, description) in enumerate(DEPARTMENTS):
+        if name not in existing:
+            existing[name] = first_id + n
+            batch.add(
+                Department.__table__,
+                {"id": existing[name], "name": name, "description": description},
+            )
+    department_ids = [existing[name] for name, _ in DEPARTMENTS]
+
+    user_id = doctor_id = availability_id = first_id
+    schedules = {}
+    for n in range(doctors):
+        name = _name(rng)
+        batch.add(
+            users,
+            {
+                "id": user_id,
+                "username": _username(name, user_id),
+                "password": hashed,
+                "role": "doctor",
+            },
+        )
+        batch.add(
+            doctor_table,
+            {
+                "id": doctor_id,
+                "user_id": user_id,
+                "department_id": department_ids[n % len(department_ids)],
+                "full_name": name,
+                "qualification": rng.choice(QUALIFICATIONS),
+            },
+        )
+        schedules[doctor_id] = _schedule(rng)
+        for day, (start, end) in schedules[doctor_id].items():
+            batch.add(
+                availability_table,
+                {
+                    "id": availability_id,
+                    "doctor_id": doctor_id,
+                    "day_of_week": WEEKDAYS[day],
+                    "start_time": start,
+                    "end_time": end,
+                    "is_available": True,
+                },
+            )
+            availability_id += 1
+        user_id += 1
+        doctor_id += 1
+
+    patient_ids = []
+    patient_id = first_id
+    for _ in range(patients):
+        name = _name(rng)
+        batch.add(
+            users,
+            {
+                "id": user_id,
+                "username": _username(name, user_id),
+                "password": hashed,
+                "role": "patient",
+            },
+        )
+        batch.add(
+            patient_table,
+            {
+                "id": patient_id,
+                "user_id": user_id,
+                "full_name": name,
+                "phone": f"9{rng.randrange(10**9):09d}",
+                "address": f"{rng.randint(1, 400)} Main Road, {rng.choice(CITIES)}",
+                "age": rng.randint(1, 90),
+            },
+        )
+        patient_ids.append(patient_id)
+        user_id += 1
+        patient_id += 1
+    batch.flush()
+    echo(f"Created {doctors} doctors and {patients} patients")
+
+    appointment_id = treatment_id = first_id
+    per_doctor, extra = divmod(appointments, doctors)
+    for n, (doc_id, weekly) in enumerate(schedules.items()):
+        days = [first_day + timedelta(days=d) for d in range(span)]
+        slots = [
+            (day, slot)
+            for day in days
+            if day.weekday() in weekly
+            for slot in _slots(*weekly[day.weekday()])
+        ]
+        wanted = per_doctor + (1 if n < extra else 0)
+        if wanted > len(slots):
+            raise SeedError(
+                f"{wanted} appointments per doctor do not fit in {years} years "
+                f"of working hours; raise --years or --doctors"
+            )
+        # Selection sampling: exactly `wanted` slots, in date order.
+        for remaining, (day, slot) in zip(range(len(slots), 0, -1), slots):
+            if rng.random() * remaining >= wanted:
+                continue
+            wanted -= 1
+            status = _visit_status(rng, day, anchor_date)
+            batch.add(
+                appointment_table,
+                {
+                    "id": appointment_id,
+                    "patient_id": _patient_for(rng, patient_ids),
+                    "doctor_id": doc_id,
+                    "date_scheduled": day,
+                    "time_scheduled": slot,
+                    "status": status,
+                },
+            )
+            if status == "Completed":
+                diagnosis, prescription, tests = rng.choice(CASES)
+                batch.add(
+                    treatment_table,
+                    {
+                        "id": treatment_id,
+                        "appointment_id": appointment_id,
+                        "diagnosis": diagnosis,
+                        "prescription": prescription,
+                        "notes": rng.choice(NOTES),
+                        "visit_type": rng.choice(VISIT_TYPES),
+                        "tests_done": tests,
+                        "date_created": datetime.combine(day, slot),
+                    },
+                )
+                treatment_id += 1
+            appointment_id += 1
+        if (n + 1) % 50 == 0 or n + 1 == doctors:
+            elapsed = time.perf_counter() - started
+            echo(f"Scheduled visits for {n + 1}/{doctors} doctors ({elapsed:.0f}s)")
+    batch.flush()
+
+    rollup.rebuild(conn)
+    versioning.bump(*versioning.ALL)
+    db.session.commit()
+    return dict(batch.inserted)
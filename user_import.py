@@ -0,0 +1,200 @@
+"""
+Bulk import of doctor and patient accounts from CSV.
+
+The CSV needs a header row. Required columns: role (doctor or patient),
+username, password and full_name. Optional columns: department (by name) and
+qualification for doctors; phone, address and age for patients.
+
+Rows are streamed, so the file is never fully in memory. Passwords are hashed
+in a process pool, which is where almost all of the time goes with pbkdf2.
+Each batch of users and their profiles is inserted in a single transaction.
+A batch the database rejects is retried row by row, so one bad row is
+reported as skipped instead of stopping the import.
+"""
+
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+import versioning
+from models import Department, Doctor, Patient, User, db
+
+ROLES = ("doctor", "patient")
+REQUIRED_COLUMNS = ("role", "username", "password", "full_name")
+
+
+def hash_password(password):
+    return generate_password_hash(password, method="pbkdf2:sha256")
+
+
+def _blank_to_none(value):
+    value = (value or "").strip()
+    return value or None
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.skipped = []
+        self.started = time.perf_counter()
+
+    def skip(self, line_no, reason):
+        self.skipped.append((line_no, reason))
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.created / self.elapsed if self.elapsed else 0.0
+
+
+def _validate(rows, departments, seen_usernames, report):
+    """Drop rows that cannot be imported; returns [(line_no, row), ...]."""
+    candidates = []
+    for line_no, row in rows:
+        role = (row.get("role") or "").strip().lower()
+        username = (row.get("username") or "").strip()
+        department = _blank_to_none(row.get("department"))
+        if role not in ROLES:
+            report.skip(line_no, f"unknown role {row.get('role')!r}")
+        elif not username or not row.get("password") or not row.get("full_name"):
+            report.skip(line_no, "missing username, password or full_name")
+        elif username in seen_usernames:
+            report.skip(line_no, f"duplicate username {username!r} in file")
+        elif role == "doctor" and department and department not in departments:
+            report.skip(line_no, f"unknown department {department!r}")
+        else:
+            seen_usernames.add(username)
+            row["role"], row["username"] = role, username
+            candidates.append((line_no, row))
+
+    existing = {
+        name
+        for (name,) in db.session.query(User.username).filter(
+            User.username.in_([row["username"] for _, row in candidates])
+        )
+    }
+    valid = []
+    for line_no, row in candidates:
+        if row["username"] in existing:
+            report.skip(line_no, f"username {row['username']!r} already exists")
+        else:
+            valid.append((line_no, row))
+    return valid
+
+
+def _add_users(valid, hashes, departments):
+    users = [
+        User(username=row["username"], password=hashed, role=row["role"])
+        for (_, row), hashed in zip(valid, hashes)
+    ]
+    db.session.add_all(users)
+    db.session.flush()
+
+    profiles = []
+    for (_, row), user in zip(valid, users):
+        if row["role"] == "doctor":
+            department = _blank_to_none(row.get("department"))
+            profiles.append(
+                Doctor(
+                    user_id=user.id,
+                    full_name=row["full_name"].strip(),
+                    department_id=departments.get(department),
+                    qualification=_blank_to_none(row.get("qualification")),
+                )
+            )
+        else:
+            age = _blank_to_none(row.get("age"))
+            profiles.append(
+                Patient(
+                    user_id=user.id,
+                    full_name=row["full_name"].strip(),
+                    phone=_blank_to_none(row.get("phone")),
+                    address=_blank_to_none(row.get("address")),
+                    age=int(age) if age and age.isdigit() else None,
+                )
+            )
+    db.session.add_all(profiles)
+    db.session.flush()
+
+
+def _insert_batch(valid, hashes, departments, report):
+    """
+    Insert a batch in one transaction and return how many users it created.
+
+    If the database rejects the batch (typically a username created by
+    someone else since _validate checked), the batch is rolled back and
+    retried one row at a time, each in its own savepoint. Rows that still
+    fail are reported as skipped and the rest are committed.
+    """
+    try:
+        _add_users(valid, hashes, departments)
+        inserted = [row for _, row in valid]
+    except IntegrityError:
+        db.session.rollback()
+        inserted = []
+        for (line_no, row), hashed in zip(valid, hashes):
+            savepoint = db.session.begin_nested()
+            try:
+                _add_users([(line_no, row)], [hashed], departments)
+                savepoint.commit()
+                inserted.append(row)
+            except IntegrityError as exc:
+                savepoint.rollback()
+                report.skip(
+                    line_no, f"username {row['username']!r} rejected: {exc.orig}"
+                )
+
+    if any(row["role"] == "doctor" for row in inserted):
+        versioning.bump(versioning.DOCTORS)
+    db.session.commit()
+    return len(inserted)
+
+
+def import_users(stream, batch_size=1000, workers=None, echo=print):
+    """Import every row of the CSV `stream`; returns an ImportReport."""
+    reader = csv.DictReader(stream)
+    missing = [c for c in REQUIRED_COLUMNS if c not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"CSV is missing required columns: {', '.join(missing)}")
+
+    departments = {
+        name: dept_id
+        for dept_id, name in db.session.query(Department.id, Department.name)
+    }
+    report = ImportReport()
+    seen_usernames = set()
+    # Header is line 1, so the first data row is line 2.
+    numbered = enumerate(reader, start=2)
+    workers = workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            batch = list(islice(numbered, batch_size))
+            if not batch:
+                break
+            valid = _validate(batch, departments, seen_usernames, report)
+            if not valid:
+                continue
+
+            chunksize = max(1, len(valid) // (workers * 4))
+            hashes = list(
+                pool.map(
+                    hash_password,
+                    [row["password"] for _, row in valid],
+                    chunksize=chunksize,
+                )
+            )
+            report.created += _insert_batch(valid, hashes, departments, report)
+            echo(
+                f"Imported {report.created} users "
+                f"({report.rows_per_second:.0f} rows/s)"
+            )
+    return report
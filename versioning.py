@@ -0,0 +1,54 @@
+"""
+Data versions for cache validation.
+
+Each cacheable data set (the department list, the doctor roster) has a row in
+`data_version`. Writes bump it in the same transaction as the change, so the
+version every worker reads from the database always matches the committed
+data. Caches key on the version and HTTP responses derive their ETag and
+Last-Modified from it, which keeps workers consistent without any
+cross-process invalidation.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from models import DataVersion, db
+
+DEPARTMENTS = "departments"
+DOCTORS = "doctors"
+
+ALL = (DEPARTMENTS, DOCTORS)
+
+
+def bump(*names):
+    """Advance the versions of `names` as part of the current transaction."""
+    now = datetime.utcnow()
+    for name in names:
+        updated = DataVersion.query.filter_by(name=name).update(
+            {"version": DataVersion.version + 1, "updated_at": now},
+            synchronize_session=False,
+        )
+        if not updated:
+            db.session.add(DataVersion(name=name, version=1, updated_at=now))
+
+
+def current(*names):
+    """
+    Return (token, last_modified) for `names`: a string that changes whenever
+    any of them is bumped, and the latest change time as an aware UTC datetime
+    rounded up to the next whole second (HTTP date precision). Rounding up
+    means a write made after a response was sent always gets a later
+    Last-Modified, as long as the response was sent after that second ended;
+    see http_cache.with_validators.
+    """
+    return summarize(names, DataVersion.query.filter(DataVersion.name.in_(names)))
+
+
+def summarize(names, rows):
+    """`current` for DataVersion rows already fetched, e.g. by an async session."""
+    rows = {row.name: row for row in rows}
+    token = ".".join(str(rows[n].version if n in rows else 0) for n in names)
+    stamps = [row.updated_at for row in rows.values()]
+    if not stamps:
+        return token, datetime(1970, 1, 1, tzinfo=timezone.utc)
+    last_modified = max(stamps).replace(microsecond=0) + timedelta(seconds=1)
+    return token, last_modified.replace(tzinfo=timezone.utc)